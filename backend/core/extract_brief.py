@@ -1,4 +1,5 @@
 import os
+import re
 import json
 import sys
 import time
@@ -6,12 +7,10 @@ import yaml
 from typing import List, Optional, Dict, Any, Literal
 from pathlib import Path
 
-from pydantic import BaseModel, field_validator
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
+from pydantic import BaseModel, PrivateAttr, field_validator
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.runnables import RunnableLambda
+from langchain_core.outputs import Generation
 
 ALLOWED_PRIMARY_METHODOLOGIES = {
     "conjoint",
@@ -25,8 +24,8 @@ ALLOWED_PRIMARY_METHODOLOGIES = {
     "descriptive",
 }
 
-# LangSmith observability
-os.environ.setdefault("LANGCHAIN_TRACING_V2", "true")
+# LangSmith observability (opt-in via SURVEY_TRACE; an explicit LANGCHAIN_TRACING_V2 still wins)
+os.environ.setdefault("LANGCHAIN_TRACING_V2", "true" if os.environ.get("SURVEY_TRACE") else "false")
 os.environ["LANGCHAIN_PROJECT"] = "Basics"  # Force override
 
 # Verify LangSmith API key is available
@@ -292,15 +291,102 @@ def strip_task_plan(text) -> str:
     """Strip TASK_PLAN block before JSON, handling both raw strings and AIMessage."""
     if hasattr(text, 'content'):
         text = text.content
-    # Find the first { which starts the JSON
-    idx = text.find('{')
-    if idx > 0:
-        text = text[idx:]
-    # Find the last } to trim any trailing text
-    ridx = text.rfind('}')
-    if ridx >= 0:
-        text = text[:ridx + 1]
-    return text
+    # JSON starts at the first { and ends at the last } after it; both are C-level
+    # scans, and slicing once avoids copying the (often tens of KB) response twice
+    start = max(text.find('{'), 0)
+    end = text.rfind('}', start)
+    if end >= 0:
+        return text[start:end + 1]
+    return text[start:] if start else text
+
+
+# Characters that can change JSON nesting/string state while scanning a stream
+_JSON_STRUCTURAL_RE = re.compile(r'[\\"{}\[\],]')
+
+
+class TaskPlanStrippingJsonParser(JsonOutputParser):
+    """JSON parser that strips the TASK_PLAN block before parsing.
+
+    Folding the strip into the parser avoids an extra RunnableLambda stage in
+    the chain, which would otherwise buffer the stream and add a traced step.
+
+    When streaming, only the newly received text is scanned for top-level
+    member boundaries, and the accumulated JSON is re-parsed only when one is
+    crossed. Other chunks return the previous partial result, so the parse
+    work grows with the number of top-level fields rather than chunks.
+    """
+
+    _scan_source: str = PrivateAttr(default="")
+    _scan_depth: int = PrivateAttr(default=0)
+    _scan_in_string: bool = PrivateAttr(default=False)
+    _scan_escaped_at: int = PrivateAttr(default=-1)
+    _last_partial: Any = PrivateAttr(default=None)
+
+    def parse_result(self, result: List[Generation], *, partial: bool = False) -> Any:
+        text = result[0].text if result else ""
+        if partial and not self._advance_scan(text):
+            return self._last_partial
+
+        parsed = super().parse_result([Generation(text=strip_task_plan(text))], partial=partial)
+        if partial and parsed is not None:
+            self._last_partial = parsed
+        return parsed
+
+    def _reset_scan(self) -> None:
+        self._scan_source = ""
+        self._scan_depth = 0
+        self._scan_in_string = False
+        self._scan_escaped_at = -1
+        self._last_partial = None
+
+    def _advance_scan(self, text: str) -> bool:
+        """Scan text appended since the last call; True if a top-level member closed."""
+        if not text.startswith(self._scan_source):
+            self._reset_scan()
+
+        start = len(self._scan_source)
+        if start == 0:
+            # Skip the TASK_PLAN preamble, matching strip_task_plan
+            start = text.find("{")
+            if start < 0:
+                return False
+
+        depth = self._scan_depth
+        in_string = self._scan_in_string
+        escaped_at = self._scan_escaped_at
+        boundary = False
+
+        for match in _JSON_STRUCTURAL_RE.finditer(text, start):
+            pos = match.start()
+            char = text[pos]
+            if in_string:
+                if pos == escaped_at:
+                    continue
+                if char == "\\":
+                    escaped_at = pos + 1
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{" or char == "[":
+                depth += 1
+            elif char == "}" or char == "]":
+                depth -= 1
+                if depth == 0:
+                    boundary = True
+            elif char == "," and depth == 1:
+                # Comma between top-level members
+                boundary = True
+
+        self._scan_source = text
+        self._scan_depth = depth
+        self._scan_in_string = in_string
+        self._scan_escaped_at = escaped_at
+        return boundary
+
+
+# Invariant across instances; computed once at import
+_FORMAT_INSTRUCTIONS = TaskPlanStrippingJsonParser().get_format_instructions()
 
 
 class BriefExtractor:
@@ -318,15 +404,18 @@ class BriefExtractor:
         if llm is not None:
             self.llm = llm
         else:
-            # Use ChatAnthropic for Claude models, ChatOpenAI for OpenAI models
+            # Use ChatAnthropic for Claude models, ChatOpenAI for OpenAI models.
+            # Provider packages are imported lazily to keep module import cheap.
             if model_name.startswith("claude"):
+                from langchain_anthropic import ChatAnthropic
                 self.llm = ChatAnthropic(model=model_name, temperature=temperature)
             else:
+                from langchain_openai import ChatOpenAI
                 self.llm = ChatOpenAI(model=model_name, temperature=temperature)
 
-        self.parser = JsonOutputParser()
+        self.parser = TaskPlanStrippingJsonParser()
         self.prompt = self._load_prompt()
-        self.chain = self.prompt | self.llm | RunnableLambda(strip_task_plan) | self.parser
+        self.chain = self.prompt | self.llm | self.parser
 
     def _load_prompt(self) -> ChatPromptTemplate:
         """Load prompt template and add parser format instructions."""
@@ -341,9 +430,7 @@ class BriefExtractor:
         template_with_format = f"{template_text}\n\n{{format_instructions}}"
         prompt = ChatPromptTemplate.from_template(template_with_format)
 
-        return prompt.partial(
-            format_instructions=self.parser.get_format_instructions()
-        )
+        return prompt.partial(format_instructions=_FORMAT_INSTRUCTIONS)
 
     async def extract_async_stream(self, brief_text: str):
         """
@@ -373,9 +460,8 @@ class BriefExtractor:
             if display_buffer:
                 yield f"data: {json.dumps({'content': display_buffer})}\n\n"
             
-            # Parse accumulated content into structured format
-            cleaned_content = strip_task_plan(accumulated_content)
-            result = self.parser.parse(cleaned_content)
+            # Parse accumulated content into structured format (parser strips TASK_PLAN)
+            result = self.parser.parse(accumulated_content)
             
             # Transform to frontend format (matching non-streaming endpoint)
             extracted_brief = {
@@ -1,23 +1,28 @@
+import io
 import os
 import json
 import sys
 import time
-from typing import List, Dict, Any, Optional, Set
+import hashlib
+import itertools
+import tempfile
+from typing import List, Dict, Any, Optional, Set, MutableMapping, Tuple, Annotated, Union
 from pathlib import Path
 
+import orjson
 from dotenv import load_dotenv
-from pydantic import BaseModel, field_validator, model_validator, ValidationError
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
+from pydantic import BaseModel, ConfigDict, Discriminator, Field, StringConstraints, Tag, field_validator, ValidationError
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import SystemMessage
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.runnables import RunnableLambda
+
+from extract_brief import TaskPlanStrippingJsonParser, strip_task_plan
 
 # Load environment variables from .env file (Windows env vars take precedence)
 load_dotenv()
 
-# LangSmith observability
-os.environ.setdefault("LANGCHAIN_TRACING_V2", "true")
+# LangSmith observability (opt-in via SURVEY_TRACE, same rule as extract_brief)
+os.environ.setdefault("LANGCHAIN_TRACING_V2", "true" if os.environ.get("SURVEY_TRACE") else "false")
 os.environ["LANGCHAIN_PROJECT"] = "Basics"  # Force override
 
 # Verify LangSmith API key is available
@@ -25,23 +30,31 @@ if os.environ.get("LANGCHAIN_TRACING_V2") == "true" and not os.environ.get("LANG
     print("⚠ Warning: LANGCHAIN_TRACING_V2 is enabled but LANGCHAIN_API_KEY is not set. Tracing will not work.")
 
 
-def strip_task_plan(text) -> str:
-    """Strip TASK_PLAN block before JSON."""
-    if hasattr(text, 'content'):
-        text = text.content
-    idx = text.find('{')
-    if idx > 0:
-        text = text[idx:]
-    ridx = text.rfind('}')
-    if ridx >= 0:
-        text = text[:ridx + 1]
-    return text
+# Everything before this marker in survey_prompt_template.txt is static instructions
+# and is sent as a separate, provider-cacheable system message.
+BRIEF_SECTION_MARKER = "--------------------\nRESEARCH BRIEF"
+
+
+# Fallback text for missing brief fields in the survey prompt. Interned so every
+# template-variable dict shares one object per placeholder.
+NONE_TEXT = sys.intern("None")
+NOT_SPECIFIED = sys.intern("Not specified")
+NONE_SPECIFIED = sys.intern("None specified")
+
+
+# Stripped, non-empty string enforced by pydantic-core (no Python validator call per field)
+NonEmptyStr = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+
 
+class SurveyModel(BaseModel):
+    """Base for survey schema models: immutable once validated."""
+    model_config = ConfigDict(frozen=True, extra="ignore", validate_assignment=False)
 
-class Question(BaseModel):
-    question_id: str
-    question_text: str
-    question_type: str  # single_choice, multiple_choice, scale, matrix, open_ended, numeric_input, stimulus_display
+
+class _QuestionBase(SurveyModel):
+    question_id: NonEmptyStr
+    question_text: NonEmptyStr
+    question_type: NonEmptyStr  # single_choice, multiple_choice, scale, matrix, open_ended, numeric_input, stimulus_display
     options: List[str] = []
     rows: Optional[List[str]] = None
     columns: Optional[List[str]] = None
@@ -54,32 +67,60 @@ class Question(BaseModel):
     required: bool = True          # NEW
     notes: Optional[str] = None    # NEW
 
-    @field_validator("question_id", "question_text", "question_type")
-    @classmethod
-    def validate_non_empty_text(cls, value: str) -> str:
-        if not value or not value.strip():
-            raise ValueError("must be a non-empty string")
-        return value.strip()
-
-    @model_validator(mode="after")
-    def validate_question(self):
-        if self.question_type == "matrix":
-            if not self.rows or not self.columns:
-                raise ValueError("matrix questions must include rows and columns")
-            if self.options:
-                raise ValueError("matrix questions must have empty options")
-        elif self.question_type in ("open_ended", "stimulus_display", "numeric_input"):  # CHANGED: added numeric_input
-            if self.options:
-                raise ValueError(f"{self.question_type} questions must have empty options")
-            if self.question_type == "stimulus_display" and not self.displays_artefact:
-                raise ValueError("stimulus_display questions must include displays_artefact field")
-        else:
-            if not self.options:
-                raise ValueError("non-open questions must include options")
-        return self
+
+class MatrixQuestion(_QuestionBase):
+    """matrix: rows and columns required, options must be empty."""
+    rows: Annotated[List[str], Field(min_length=1)]
+    columns: Annotated[List[str], Field(min_length=1)]
+    options: Annotated[List[str], Field(max_length=0)] = []
+
+
+class OpenQuestion(_QuestionBase):
+    """open_ended / numeric_input: no options."""
+    options: Annotated[List[str], Field(max_length=0)] = []
+
+
+class StimulusQuestion(_QuestionBase):
+    """stimulus_display: no options, must reference an artefact."""
+    options: Annotated[List[str], Field(max_length=0)] = []
+    displays_artefact: Annotated[str, StringConstraints(min_length=1)]
+
+
+class ChoiceQuestion(_QuestionBase):
+    """Any other type (single_choice, multiple_choice, scale, ranking, ...): options required."""
+    options: Annotated[List[str], Field(min_length=1)]
+
+
+_QUESTION_VARIANT_BY_TYPE = {
+    "matrix": "matrix",
+    "open_ended": "open",
+    "numeric_input": "open",
+    "stimulus_display": "stimulus",
+}
+
+
+def _question_variant(value: Any) -> str:
+    """Map question_type to a variant tag; unknown types are choice questions."""
+    qtype = value.get("question_type") if isinstance(value, dict) else getattr(value, "question_type", None)
+    if isinstance(qtype, str):
+        qtype = qtype.strip()
+    return _QUESTION_VARIANT_BY_TYPE.get(qtype, "choice")
+
+
+# Variant constraints are enforced by pydantic-core per tag instead of a Python
+# model_validator; the callable discriminator keeps free-form choice types valid.
+Question = Annotated[
+    Union[
+        Annotated[MatrixQuestion, Tag("matrix")],
+        Annotated[OpenQuestion, Tag("open")],
+        Annotated[StimulusQuestion, Tag("stimulus")],
+        Annotated[ChoiceQuestion, Tag("choice")],
+    ],
+    Discriminator(_question_variant),
+]
 
 
-class Section(BaseModel):
+class Section(SurveyModel):
     questions: List[Question]
 
     @field_validator("questions")
@@ -90,19 +131,12 @@ class Section(BaseModel):
         return value
 
 
-class SubSection(BaseModel):
-    subsection_id: str
-    subsection_title: str
+class SubSection(SurveyModel):
+    subsection_id: NonEmptyStr
+    subsection_title: NonEmptyStr
     purpose: Optional[str] = None  # NEW
     questions: List[Question]
 
-    @field_validator("subsection_id", "subsection_title")
-    @classmethod
-    def validate_non_empty_text(cls, value: str) -> str:
-        if not value or not value.strip():
-            raise ValueError("must be a non-empty string")
-        return value.strip()
-
     @field_validator("questions")
     @classmethod
     def validate_questions(cls, value: List[Question]) -> List[Question]:
@@ -111,7 +145,7 @@ class SubSection(BaseModel):
         return value
 
 
-class MainSection(BaseModel):
+class MainSection(SurveyModel):
     sub_sections: List[SubSection]
 
     @field_validator("sub_sections")
@@ -122,18 +156,11 @@ class MainSection(BaseModel):
         return value
 
 
-class DimensionCoverage(BaseModel):
-    key_dimension: str
-    how_addressed: str
+class DimensionCoverage(SurveyModel):
+    key_dimension: NonEmptyStr
+    how_addressed: NonEmptyStr
     question_ids: List[str]
 
-    @field_validator("key_dimension", "how_addressed")
-    @classmethod
-    def validate_non_empty_text(cls, value: str) -> str:
-        if not value or not value.strip():
-            raise ValueError("must be a non-empty string")
-        return value.strip()
-
     @field_validator("question_ids")
     @classmethod
     def validate_question_ids(cls, value: List[str]) -> List[str]:
@@ -145,60 +172,32 @@ class DimensionCoverage(BaseModel):
         return cleaned
 
 
-class Artefact(BaseModel):
-    artefact_id: str
-    artefact_type: str  # e.g., "concept", "stimulus", "image"
-    title: str
-    content: str
-
-    @field_validator("artefact_id", "artefact_type", "title", "content")
-    @classmethod
-    def validate_non_empty_text(cls, value: str) -> str:
-        if not value or not value.strip():
-            raise ValueError("must be a non-empty string")
-        return value.strip()
+class Artefact(SurveyModel):
+    artefact_id: NonEmptyStr
+    artefact_type: NonEmptyStr  # e.g., "concept", "stimulus", "image"
+    title: NonEmptyStr
+    content: NonEmptyStr
 
 
-class StudyMetadata(BaseModel):
-    study_type: str
-    description: str
+class StudyMetadata(SurveyModel):
+    study_type: NonEmptyStr
+    description: NonEmptyStr
     estimated_loi_minutes: Optional[str] = None  # NEW
     artefacts: List[Artefact] = []
 
-    @field_validator("study_type", "description")
-    @classmethod
-    def validate_non_empty_text(cls, value: str) -> str:
-        if not value or not value.strip():
-            raise ValueError("must be a non-empty string")
-        return value.strip()
-
 
-class RoutingRule(BaseModel):
-    rule_id: str
-    condition: str
-    action: str
+class RoutingRule(SurveyModel):
+    rule_id: NonEmptyStr
+    condition: NonEmptyStr
+    action: NonEmptyStr
 
-    @field_validator("rule_id", "condition", "action")
-    @classmethod
-    def validate_non_empty_text(cls, value: str) -> str:
-        if not value or not value.strip():
-            raise ValueError("must be a non-empty string")
-        return value.strip()
 
-
-class Flow(BaseModel):
-    summary: str  # CHANGED: was "description"
+class Flow(SurveyModel):
+    summary: NonEmptyStr  # CHANGED: was "description"
     routing_rules: List[RoutingRule] = []
 
-    @field_validator("summary")  # CHANGED: was "description"
-    @classmethod
-    def validate_non_empty_text(cls, value: str) -> str:
-        if not value or not value.strip():
-            raise ValueError("must be a non-empty string")
-        return value.strip()
 
-
-class SampleRequirements(BaseModel):
+class SampleRequirements(SurveyModel):
     """NEW: Sample configuration and quotas."""
     total_sample: Optional[int] = None
     target_audience_summary: Optional[str] = None
@@ -208,7 +207,7 @@ class SampleRequirements(BaseModel):
     exclusions: Optional[List[str]] = None
 
 
-class ProgrammingSpecifications(BaseModel):
+class ProgrammingSpecifications(SurveyModel):
     """NEW: Technical implementation details."""
     estimated_loi_minutes: Optional[str] = None
     loi_breakdown: Optional[Dict[str, str]] = None
@@ -219,14 +218,14 @@ class ProgrammingSpecifications(BaseModel):
     randomization_notes: Optional[str] = None
 
 
-class AnalysisPlan(BaseModel):
+class AnalysisPlan(SurveyModel):
     """NEW: Analytical approach and deliverables."""
     primary_analyses: List[str] = []
     deliverables: List[str] = []
     strategic_outputs: List[str] = []
 
 
-class Survey(BaseModel):
+class Survey(SurveyModel):
     STUDY_METADATA: StudyMetadata
     SAMPLE_REQUIREMENTS: Optional[SampleRequirements] = None  # NEW
     SCREENER: Section
@@ -245,14 +244,25 @@ class Survey(BaseModel):
         return value
 
 
+# Built once at import so request paths reuse the compiled core schema
+_SURVEY_VALIDATOR = Survey.__pydantic_validator__
+_FORMAT_INSTRUCTIONS = JsonOutputParser().get_format_instructions()
+
+
 class SurveyGenerator:
     """Survey generator that executes approved blueprint (Agent 2)."""
 
+    # Prompt template text keyed by (path, st_mtime_ns, st_size); a new generator is
+    # built per API request, so warm instances skip the read + decode.
+    _TEMPLATE_CACHE: Dict[Tuple[str, int, int], str] = {}
+
     def __init__(
         self, 
         llm=None, 
         model_name: str = "claude-sonnet-4-5-20250929", 
-        temperature: float = 1.0
+        temperature: float = 1.0,
+        cache_dir: Optional[Path] = None,
+        cache: Optional[MutableMapping[str, str]] = None,
     ):
         """
         Initialize with any LangChain-compatible LLM.
@@ -261,19 +271,39 @@ class SurveyGenerator:
             llm: Pre-configured LLM instance (optional). If provided, model_name is ignored.
             model_name: Model identifier if llm not provided (default: claude-sonnet-4-5-20250929)
             temperature: Temperature setting if llm not provided
+            cache_dir: Directory for cached generation results (optional).
+                Defaults to SURVEY_CACHE_DIR if set; caching is off otherwise.
+            cache: In-memory mapping of cache key -> survey JSON, checked before disk (optional)
         """
         if llm is not None:
             self.llm = llm
         else:
-            # Use ChatAnthropic for Claude models, ChatOpenAI for OpenAI models
+            # Use ChatAnthropic for Claude models, ChatOpenAI for OpenAI models.
+            # Provider packages are imported lazily to keep module import cheap.
             if model_name.startswith("claude"):
+                from langchain_anthropic import ChatAnthropic
                 self.llm = ChatAnthropic(model=model_name, temperature=temperature)
             else:
+                from langchain_openai import ChatOpenAI
                 self.llm = ChatOpenAI(model=model_name, temperature=temperature)
 
-        self.parser = JsonOutputParser()
+        if cache_dir is None and os.environ.get("SURVEY_CACHE_DIR"):
+            cache_dir = Path(os.environ["SURVEY_CACHE_DIR"])
+        self.cache_dir = cache_dir
+        self.cache = cache
+        # Single-entry memo of the last generate() call (serialized; callers mutate results)
+        self._last_brief_key: Optional[bytes] = None
+        self._last_result: Optional[bytes] = None
+        self._model_id = str(
+            getattr(self.llm, "model_name", None)
+            or getattr(self.llm, "model", None)
+            or model_name
+        )
+
+        # Strips TASK_PLAN itself and, when streaming, re-parses only as top-level keys close
+        self.parser = TaskPlanStrippingJsonParser()
         self.prompt = self._load_prompt()
-        self.chain = self.prompt | self.llm | RunnableLambda(strip_task_plan) | self.parser
+        self.chain = self.prompt | self.llm | self.parser
 
     def _load_prompt(self) -> ChatPromptTemplate:
         """
@@ -283,21 +313,61 @@ class SurveyGenerator:
         backend_dir = Path(__file__).parent.parent
         prompt_path = backend_dir / "survey_prompt_template.txt"
         
-        if not prompt_path.exists():
-            raise FileNotFoundError(f"Prompt template not found: {prompt_path}")
-
-        template_text = prompt_path.read_text(encoding="utf-8")
+        template_text = self._read_template(prompt_path)
+        self._template_digest = hashlib.blake2b(template_text.encode("utf-8"), digest_size=16).hexdigest()
         
+        static_prefix, marker, brief_section = template_text.partition(BRIEF_SECTION_MARKER)
+        if not marker:
+            # No recognizable static header: send the whole template as one message
+            static_prefix, brief_section = "", template_text
+
         # Add format_instructions placeholder at the end
-        template_with_format = f"{template_text}\n\n{{format_instructions}}"
+        template_with_format = f"{marker}{brief_section}\n\n{{format_instructions}}"
         
         # Create prompt template with all expected variables
-        prompt = ChatPromptTemplate.from_template(template_with_format)
+        if static_prefix:
+            prompt = ChatPromptTemplate.from_messages([
+                self._static_system_message(static_prefix),
+                ("human", template_with_format),
+            ])
+        else:
+            prompt = ChatPromptTemplate.from_template(template_with_format)
 
         # Partial with format_instructions (static)
-        return prompt.partial(
-            format_instructions=self.parser.get_format_instructions()
-        )
+        return prompt.partial(format_instructions=_FORMAT_INSTRUCTIONS)
+
+    @classmethod
+    def _read_template(cls, prompt_path: Path) -> str:
+        """Read a prompt template, reusing the cached text while the file is unchanged."""
+        try:
+            st = prompt_path.stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Prompt template not found: {prompt_path}") from None
+
+        key = (str(prompt_path), st.st_mtime_ns, st.st_size)
+        template_text = cls._TEMPLATE_CACHE.get(key)
+        if template_text is None:
+            template_text = prompt_path.read_text(encoding="utf-8")
+            # Drop entries for older versions of the same file
+            for stale in [k for k in cls._TEMPLATE_CACHE if k[0] == key[0]]:
+                del cls._TEMPLATE_CACHE[stale]
+            cls._TEMPLATE_CACHE[key] = template_text
+        return template_text
+
+    def _static_system_message(self, text: str) -> SystemMessage:
+        """
+        Build the static instruction header as a literal (non-templated) message.
+
+        For Anthropic models the block is marked with cache_control so repeat
+        calls reuse the provider-side prompt cache; OpenAI caches long shared
+        prefixes automatically and rejects unknown block fields.
+        """
+        text = text.replace("{{", "{").replace("}}", "}").rstrip() + "\n"
+        if getattr(self.llm, "_llm_type", "") == "anthropic-chat":
+            return SystemMessage(content=[
+                {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+            ])
+        return SystemMessage(content=text)
 
     async def generate_async_stream(self, brief_data: Dict[str, Any]):
         """
@@ -327,9 +397,8 @@ class SurveyGenerator:
             if display_buffer:
                 yield f"data: {json.dumps({'content': display_buffer})}\n\n"
             
-            # Parse accumulated content into structured format
-            cleaned_content = strip_task_plan(accumulated_content)
-            survey_json = self.parser.parse(cleaned_content)
+            # Parse accumulated content into structured format (parser strips TASK_PLAN)
+            survey_json = self.parser.parse(accumulated_content)
             
             # Add LOI configuration with default slider position (matching non-streaming)
             try:
@@ -355,15 +424,100 @@ class SurveyGenerator:
 
         Note: Streaming with Anthropic + JsonOutputParser has known issues.
         Will automatically fall back to non-streaming if streaming fails.
+
+        When a cache is configured, identical briefs (same template variables,
+        model and prompt template) return the stored survey without an LLM call.
+        Re-running the same brief on the same generator instance always returns
+        a copy of the previous result without any work.
         """
+        brief_key = hashlib.blake2b(
+            orjson.dumps(brief_data, option=orjson.OPT_SORT_KEYS, default=str), digest_size=16
+        ).digest()
+        if brief_key == self._last_brief_key and self._last_result is not None:
+            print("✓ Using previous survey for unchanged brief\n", flush=True)
+            return orjson.loads(self._last_result)
+
+        cache_key = self._cache_key(brief_data) if self._cache_enabled() else None
+        if cache_key:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                print("✓ Using cached survey\n", flush=True)
+                self._last_brief_key = brief_key
+                self._last_result = orjson.dumps(cached, default=str)
+                return cached
+
         if stream_output:
             try:
-                return self._generate_streaming(brief_data)
+                result = self._generate_streaming(brief_data)
             except Exception as e:
                 print(f"\n⚠ Streaming failed: {str(e)[:80]}", flush=True)
                 print("⚠ Falling back to non-streaming mode...\n", flush=True)
-                return self._generate_non_streaming(brief_data)
-        return self._generate_non_streaming(brief_data)
+                result = self._generate_non_streaming(brief_data)
+        else:
+            result = self._generate_non_streaming(brief_data)
+
+        if cache_key and result:
+            self._cache_put(cache_key, result)
+        if result:
+            self._last_brief_key = brief_key
+            self._last_result = orjson.dumps(result, default=str)
+        return result
+
+    def generate_model(self, brief_data: Dict[str, Any]) -> Survey:
+        """
+        Generate and validate a Survey model in one pass.
+
+        The raw LLM text goes straight to pydantic-core's validate_json, skipping
+        the intermediate dict from JsonOutputParser. Raises ValidationError if the
+        output is not a valid survey; the result cache is not consulted.
+        """
+        template_vars = self._prepare_vars(brief_data)
+        print("Generating survey...", flush=True)
+        message = (self.prompt | self.llm).invoke(template_vars)
+        print("✓ Generation complete\n", flush=True)
+        return _SURVEY_VALIDATOR.validate_json(strip_task_plan(message))
+
+    def _cache_enabled(self) -> bool:
+        return self.cache is not None or self.cache_dir is not None
+
+    def _cache_key(self, brief_data: Dict[str, Any]) -> str:
+        """Content-addressed key over model, prompt template and template variables."""
+        template_vars = self._prepare_vars(brief_data)
+        payload = orjson.dumps(template_vars, option=orjson.OPT_SORT_KEYS, default=str)
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (self._model_id.encode("utf-8"), self._template_digest.encode("utf-8"), payload):
+            digest.update(part)
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a fresh copy of a cached survey (callers mutate the result)."""
+        if self.cache is not None and key in self.cache:
+            return json.loads(self.cache[key])
+        if self.cache_dir is not None:
+            path = self.cache_dir / f"{key}.json"
+            try:
+                text = path.read_text(encoding="utf-8")
+            except OSError:
+                return None
+            if self.cache is not None:
+                self.cache[key] = text
+            return json.loads(text)
+        return None
+
+    def _cache_put(self, key: str, result: Dict[str, Any]) -> None:
+        text = json.dumps(result, default=str)
+        if self.cache is not None:
+            self.cache[key] = text
+        if self.cache_dir is not None:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp_path, self.cache_dir / f"{key}.json")
+            except OSError as e:
+                print(f"Warning: Failed to write survey cache: {e}")
 
     def _generate_streaming(self, brief_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Stream partial JSON as generated (works with ANY provider)."""
@@ -412,58 +566,44 @@ class SurveyGenerator:
         Formats the approved survey blueprint for injection.
         Supports V2 schema with market_context, stimuli_content, and operational fields.
         """
-        study_design = brief_data.get("study_design") or {}
-        measurement_guidance = brief_data.get("measurement_guidance") or {}
-        stimuli_details = study_design.get("stimuli_details") or {}
+        get = brief_data.get
+        study_design = get("study_design") or {}
+        sd_get = study_design.get
+        measurement_guidance = get("measurement_guidance") or {}
+        stimuli_details = sd_get("stimuli_details") or {}
         
         # V2: Extract market_context
-        market_context = brief_data.get("market_context") or {}
+        market_context = get("market_context") or {}
         
         # V2: Extract operational requirements
-        operational = brief_data.get("operational") or {}
+        operational = get("operational") or {}
         
         # NEW: Format survey_blueprint as JSON string for injection
-        survey_blueprint = brief_data.get("survey_blueprint")
+        survey_blueprint = get("survey_blueprint")
         if survey_blueprint:
             survey_blueprint_str = json.dumps(survey_blueprint, indent=2)
         else:
             survey_blueprint_str = "No blueprint provided"
         
         # Format attribute_testing array for template
-        attribute_testing = study_design.get("attribute_testing")
+        attribute_testing = sd_get("attribute_testing")
         if attribute_testing and isinstance(attribute_testing, list):
-            attr_lines = []
-            for attr in attribute_testing:
-                if isinstance(attr, dict):
-                    attr_name = attr.get("attribute_name", "")
-                    level_count = attr.get("level_count", "")
-                    levels = attr.get("levels", [])
-                    
-                    level_info = f" ({level_count} levels)" if level_count else ""
-                    attr_lines.append(f"    * {attr_name}{level_info}")
-                    
-                    if levels and isinstance(levels, list):
-                        for level in levels:
-                            attr_lines.append(f"      - {level}")
-            
-            attribute_testing_str = "\n".join(attr_lines) if attr_lines else "None"
+            attribute_testing_str = "\n".join(_attribute_lines(attribute_testing)) or NONE_TEXT
         else:
-            attribute_testing_str = attribute_testing or "None"
+            attribute_testing_str = attribute_testing or NONE_TEXT
         
         # Format quotas for prompt
-        quotas = brief_data.get("quotas")
+        quotas = get("quotas")
         if quotas and isinstance(quotas, list):
-            quota_lines = []
-            for q in quotas:
-                if isinstance(q, dict):
-                    groups_str = ", ".join(
-                        f"{g['label']} (min: {g.get('min', 'n/a')}, max: {g.get('max', 'n/a')})"
-                        for g in q.get("groups", [])
-                    )
-                    quota_lines.append(f"- {q['attribute']} ({q['type']}): {groups_str}")
-            quotas_str = "\n".join(quota_lines) if quota_lines else "None specified"
+            quotas_str = "\n".join(
+                f"- {q['attribute']} ({q['type']}): " + ", ".join(
+                    f"{g['label']} (min: {g.get('min', 'n/a')}, max: {g.get('max', 'n/a')})"
+                    for g in q.get("groups", [])
+                )
+                for q in quotas if isinstance(q, dict)
+            ) or NONE_SPECIFIED
         else:
-            quotas_str = "None specified"
+            quotas_str = NONE_SPECIFIED
         
         # V2: Format required_outputs list
         required_outputs = measurement_guidance.get("required_outputs")
@@ -475,79 +615,66 @@ class SurveyGenerator:
         # V2: Format stimuli_content list
         stimuli_content = stimuli_details.get("stimuli_content")
         if isinstance(stimuli_content, list):
-            stimuli_lines = []
-            for i, stim in enumerate(stimuli_content, 1):
-                if isinstance(stim, dict):
-                    # Handle both 'stimulus_id' and 'label' keys
-                    stim_id = stim.get("stimulus_id") or stim.get("label", f"Stimulus {i}")
-                    title = stim.get("title", "")
-                    desc = stim.get("description", "")
-                    if title:
-                        stimuli_lines.append(f"**{stim_id}** - {title}")
-                    else:
-                        stimuli_lines.append(f"**{stim_id}**")
-                    if desc:
-                        stimuli_lines.append(f"  {desc}")
-            stimuli_content_str = "\n".join(stimuli_lines) if stimuli_lines else "None"
+            stimuli_content_str = "\n".join(_stimulus_lines(stimuli_content)) or NONE_TEXT
         else:
-            stimuli_content_str = "None"
+            stimuli_content_str = NONE_TEXT
         
         # V2: Format competitor_brands list
         competitor_brands = market_context.get("competitor_brands", [])
         if isinstance(competitor_brands, list) and competitor_brands:
             competitor_brands_str = ", ".join(competitor_brands)
         else:
-            competitor_brands_str = "None specified"
+            competitor_brands_str = NONE_SPECIFIED
         
         # V2: Format quality_controls list
         quality_controls = operational.get("quality_controls")
         if isinstance(quality_controls, list) and quality_controls:
             quality_controls_str = ", ".join(quality_controls)
         else:
-            quality_controls_str = "None specified"
+            quality_controls_str = NONE_SPECIFIED
         
         return dict(
             # Core study fields
-            objective=brief_data.get("objective", ""),
-            target_audience=brief_data.get("target_audience", ""),
-            key_dimensions=json.dumps(brief_data.get("key_dimensions", [])),
-            study_type=brief_data.get("study_type") or "descriptive",
-            primary_methodology=brief_data.get("primary_methodology") or "descriptive",
-            secondary_objectives=", ".join(brief_data.get("secondary_objectives", [])) or "None",
+            objective=get("objective", ""),
+            target_audience=get("target_audience", ""),
+            key_dimensions=orjson.dumps(get("key_dimensions", [])).decode(),
+            study_type=get("study_type") or "descriptive",
+            primary_methodology=get("primary_methodology") or "descriptive",
+            secondary_objectives=", ".join(get("secondary_objectives", [])) or NONE_TEXT,
             
             # V2: Market context fields (matching extract_brief.py MarketContext model)
-            client_brand=market_context.get("client_brand") or "Not specified",
+            client_brand=market_context.get("client_brand") or NOT_SPECIFIED,
             competitor_brands=competitor_brands_str,
-            category=market_context.get("category") or "Not specified",
-            market=market_context.get("market") or "Not specified",
+            category=market_context.get("category") or NOT_SPECIFIED,
+            market=market_context.get("market") or NOT_SPECIFIED,
             
             # Stimuli fields (V2 updated)
-            stimuli_type=stimuli_details.get("stimuli_type") or "None",
-            stimuli_count=stimuli_details.get("stimuli_count") or "None",
-            stimuli_format=stimuli_details.get("stimuli_format") or "None",
+            stimuli_type=stimuli_details.get("stimuli_type") or NONE_TEXT,
+            stimuli_count=stimuli_details.get("stimuli_count") or NONE_TEXT,
+            stimuli_format=stimuli_details.get("stimuli_format") or NONE_TEXT,
             stimuli_content=stimuli_content_str,
             
             # Study design fields
-            exposure_design=study_design.get("exposure_design") or "All respondents see same questions",
-            comparison_intent=study_design.get("comparison_intent") or "None",
-            respondent_splitting=study_design.get("respondent_splitting") or "None",
+            exposure_design=sd_get("exposure_design") or "All respondents see same questions",
+            comparison_intent=sd_get("comparison_intent") or NONE_TEXT,
+            respondent_splitting=sd_get("respondent_splitting") or NONE_TEXT,
             attribute_testing=attribute_testing_str,
             
             # Measurement fields (V2 updated)
             measurement_priority=measurement_guidance.get("measurement_priority") or "Standard metrics",
             required_outputs=required_outputs_str,
-            segmentation_intent=measurement_guidance.get("segmentation_intent") or "None",
-            benchmarking=measurement_guidance.get("benchmarking") or "None",
+            segmentation_intent=measurement_guidance.get("segmentation_intent") or NONE_TEXT,
+            benchmarking=measurement_guidance.get("benchmarking") or NONE_TEXT,
             
             # V2: Operational fields (matching extract_brief.py Operational model)
-            target_loi_minutes=operational.get("target_loi_minutes") or "Not specified",
+            target_loi_minutes=operational.get("target_loi_minutes") or NOT_SPECIFIED,
             fieldwork_mode=operational.get("fieldwork_mode") or "Online",
-            market_specifics=operational.get("market_specifics") or "None",
+            market_specifics=operational.get("market_specifics") or NONE_TEXT,
             quality_controls=quality_controls_str,
-            constraints=operational.get("constraints") or "None",
+            constraints=operational.get("constraints") or NONE_TEXT,
             
             # Sample size (V2)
-            total_sample_size=brief_data.get("total_sample_size", "Not specified"),
+            total_sample_size=get("total_sample_size", NOT_SPECIFIED),
             
             # Other fields
             quotas=quotas_str,
@@ -555,164 +682,193 @@ class SurveyGenerator:
         )
 
 
+def _attribute_lines(attribute_testing: List[Any]):
+    """Yield prompt lines for attribute_testing entries and their levels."""
+    for attr in attribute_testing:
+        if isinstance(attr, dict):
+            level_count = attr.get("level_count", "")
+            level_info = f" ({level_count} levels)" if level_count else ""
+            yield f"    * {attr.get('attribute_name', '')}{level_info}"
+
+            levels = attr.get("levels", [])
+            if levels and isinstance(levels, list):
+                yield from (f"      - {level}" for level in levels)
+
+
+def _stimulus_lines(stimuli_content: List[Any]):
+    """Yield prompt lines for stimuli_content entries."""
+    for i, stim in enumerate(stimuli_content, 1):
+        if isinstance(stim, dict):
+            # Handle both 'stimulus_id' and 'label' keys
+            stim_id = stim.get("stimulus_id") or stim.get("label", f"Stimulus {i}")
+            title = stim.get("title", "")
+            yield f"**{stim_id}** - {title}" if title else f"**{stim_id}**"
+            desc = stim.get("description", "")
+            if desc:
+                yield f"  {desc}"
+
+
 def non_empty_str_list(value: Any) -> List[str]:
     if not isinstance(value, list):
         return []
     return [item.strip() for item in value if isinstance(item, str) and item.strip()]
 
 
-def render_question_markdown(question: Dict[str, Any]) -> str:
-    lines = [
-        f"### {question.get('question_id', '').strip()}",
-        question.get("question_text", "").strip(),
-        f"*Type:* {question.get('question_type', '').strip()}"
-    ]
-
-    q_type = question.get("question_type")
-    if q_type == "matrix":
+def _write_question_markdown(buf: io.StringIO, question: Dict[str, Any]) -> None:
+    write = buf.write
+    write(f"### {question.get('question_id', '').strip()}\n")
+    write(question.get("question_text", "").strip() + "\n")
+    write(f"*Type:* {question.get('question_type', '').strip()}\n")
+
+    if question.get("question_type") == "matrix":
         rows = non_empty_str_list(question.get("rows"))
         cols = non_empty_str_list(question.get("columns"))
         if rows:
-            lines.append("**Rows:**")
-            lines.extend(f"- {row}" for row in rows)
+            write("**Rows:**\n- " + "\n- ".join(rows) + "\n")
         if cols:
-            lines.append("**Columns:**")
-            lines.extend(f"- {col}" for col in cols)
+            write("**Columns:**\n- " + "\n- ".join(cols) + "\n")
     else:
-        for option in non_empty_str_list(question.get("options")):
-            lines.append(f"- {option}")
+        options = non_empty_str_list(question.get("options"))
+        if options:
+            write("- " + "\n- ".join(options) + "\n")
     
     # V2: Render notes field if present
     if question.get("notes"):
-        lines.append(f"*Notes:* {question['notes']}")
+        write(f"*Notes:* {question['notes']}\n")
+
+
+def render_question_markdown(question: Dict[str, Any]) -> str:
+    buf = io.StringIO()
+    _write_question_markdown(buf, question)
+    return buf.getvalue()
 
-    return "\n".join(lines) + "\n"
+
+def _write_bullets(buf: io.StringIO, heading: str, items: Any) -> None:
+    buf.write(heading + "\n")
+    for item in items:
+        buf.write(f"- {item}\n")
 
 
 def format_markdown(survey: Dict[str, Any]) -> str:
-    lines: List[str] = ["# Survey Questionnaire"]
+    buf = io.StringIO()
+    write = buf.write
+    write("# Survey Questionnaire\n")
 
     # V2: Render SAMPLE_REQUIREMENTS if present
     sample_req = survey.get("SAMPLE_REQUIREMENTS")
     if sample_req:
-        lines.append("## SAMPLE REQUIREMENTS")
+        write("## SAMPLE REQUIREMENTS\n")
         if sample_req.get("total_sample"):
-            lines.append(f"**Total Sample:** {sample_req['total_sample']}")
+            write(f"**Total Sample:** {sample_req['total_sample']}\n")
         if sample_req.get("target_audience_summary"):
-            lines.append(f"**Target Audience:** {sample_req['target_audience_summary']}")
+            write(f"**Target Audience:** {sample_req['target_audience_summary']}\n")
         if sample_req.get("qualification_criteria"):
-            lines.append("**Qualification Criteria:**")
-            for criterion in sample_req['qualification_criteria']:
-                lines.append(f"- {criterion}")
+            _write_bullets(buf, "**Qualification Criteria:**", sample_req['qualification_criteria'])
         if sample_req.get("hard_quotas"):
-            lines.append("**Hard Quotas:**")
+            write("**Hard Quotas:**\n")
             for quota in sample_req['hard_quotas']:
-                lines.append(f"- {quota['attribute']}: {', '.join(quota['groups'])}")
+                write(f"- {quota['attribute']}: {', '.join(quota['groups'])}\n")
         if sample_req.get("soft_quotas"):
-            lines.append("**Soft Quotas:**")
+            write("**Soft Quotas:**\n")
             for quota in sample_req['soft_quotas']:
-                lines.append(f"- {quota['attribute']}: {', '.join(quota['groups'])}")
+                write(f"- {quota['attribute']}: {', '.join(quota['groups'])}\n")
         if sample_req.get("exclusions"):
-            lines.append("**Exclusions:**")
-            for excl in sample_req['exclusions']:
-                lines.append(f"- {excl}")
-        lines.append("")
+            _write_bullets(buf, "**Exclusions:**", sample_req['exclusions'])
+        write("\n")
 
-    lines.append("## SCREENER")
+    # Each question block ends with a blank line
+    write("## SCREENER\n")
     for question in survey.get("SCREENER", {}).get("questions", []):
-        lines.append(render_question_markdown(question))
+        _write_question_markdown(buf, question)
+        write("\n")
 
-    lines.append("## MAIN SECTION")
+    write("## MAIN SECTION\n")
     for subsection in survey.get("MAIN_SECTION", {}).get("sub_sections", []):
         title = subsection.get("subsection_title", "").strip()
         if title:
-            lines.append(f"### {title}")
+            write(f"### {title}\n")
         for question in subsection.get("questions", []):
-            lines.append(render_question_markdown(question))
+            _write_question_markdown(buf, question)
+            write("\n")
 
-    lines.append("## DEMOGRAPHICS")
+    write("## DEMOGRAPHICS\n")
     for question in survey.get("DEMOGRAPHICS", {}).get("questions", []):
-        lines.append(render_question_markdown(question))
+        _write_question_markdown(buf, question)
+        write("\n")
 
     # V2: Render PROGRAMMING_SPECIFICATIONS if present
     prog_spec = survey.get("PROGRAMMING_SPECIFICATIONS")
     if prog_spec:
-        lines.append("## PROGRAMMING SPECIFICATIONS")
+        write("## PROGRAMMING SPECIFICATIONS\n")
         if prog_spec.get("estimated_loi_minutes"):
-            lines.append(f"**Estimated LOI:** {prog_spec['estimated_loi_minutes']} minutes")
+            write(f"**Estimated LOI:** {prog_spec['estimated_loi_minutes']} minutes\n")
         if prog_spec.get("loi_breakdown"):
-            lines.append("**LOI Breakdown:**")
+            write("**LOI Breakdown:**\n")
             for section, mins in prog_spec['loi_breakdown'].items():
-                lines.append(f"- {section}: {mins} minutes")
+                write(f"- {section}: {mins} minutes\n")
         if prog_spec.get("quality_controls"):
-            lines.append("**Quality Controls:**")
-            for qc in prog_spec['quality_controls']:
-                lines.append(f"- {qc}")
+            _write_bullets(buf, "**Quality Controls:**", prog_spec['quality_controls'])
         if prog_spec.get("mobile_optimization"):
-            lines.append(f"**Mobile Optimization:** {prog_spec['mobile_optimization']}")
+            write(f"**Mobile Optimization:** {prog_spec['mobile_optimization']}\n")
         if prog_spec.get("progress_indicator"):
-            lines.append(f"**Progress Indicator:** {prog_spec['progress_indicator']}")
+            write(f"**Progress Indicator:** {prog_spec['progress_indicator']}\n")
         if prog_spec.get("quota_management"):
-            lines.append(f"**Quota Management:** {prog_spec['quota_management']}")
+            write(f"**Quota Management:** {prog_spec['quota_management']}\n")
         if prog_spec.get("randomization_notes"):
-            lines.append("**Randomization:**")
-            for note in prog_spec['randomization_notes']:
-                lines.append(f"- {note}")
-        lines.append("")
+            _write_bullets(buf, "**Randomization:**", prog_spec['randomization_notes'])
+        write("\n")
 
     # V2: Render ANALYSIS_PLAN if present
     analysis = survey.get("ANALYSIS_PLAN")
     if analysis:
-        lines.append("## ANALYSIS PLAN")
+        write("## ANALYSIS PLAN\n")
         if analysis.get("primary_analyses"):
-            lines.append("**Primary Analyses:**")
-            for item in analysis['primary_analyses']:
-                lines.append(f"- {item}")
+            _write_bullets(buf, "**Primary Analyses:**", analysis['primary_analyses'])
         if analysis.get("deliverables"):
-            lines.append("**Deliverables:**")
-            for item in analysis['deliverables']:
-                lines.append(f"- {item}")
+            _write_bullets(buf, "**Deliverables:**", analysis['deliverables'])
         if analysis.get("strategic_outputs"):
-            lines.append("**Strategic Outputs:**")
-            for item in analysis['strategic_outputs']:
-                lines.append(f"- {item}")
-        lines.append("")
+            _write_bullets(buf, "**Strategic Outputs:**", analysis['strategic_outputs'])
+        write("\n")
 
-    lines.append("## DIMENSION COVERAGE SUMMARY")
+    write("## DIMENSION COVERAGE SUMMARY\n")
     for entry in survey.get("DIMENSION_COVERAGE_SUMMARY", []):
         dimension = str(entry.get("key_dimension", "")).strip()
         how = str(entry.get("how_addressed", "")).strip()
         qids = ", ".join(non_empty_str_list(entry.get("question_ids")))
-        lines.append(f"- **{dimension}**")
+        write(f"- **{dimension}**\n")
         if how:
-            lines.append(f"  - How addressed: {how}")
+            write(f"  - How addressed: {how}\n")
         if qids:
-            lines.append(f"  - Question IDs: {qids}")
+            write(f"  - Question IDs: {qids}\n")
 
-    return "\n".join(lines).strip() + "\n"
+    return buf.getvalue().strip() + "\n"
 
 
-def stream_text(text: str, delay: float = 0.01):
-    """Print text character by character to simulate streaming."""
-    for char in text:
-        sys.stdout.write(char)
+def stream_text(text: str, delay: float = 0.01, chunk: int = 32):
+    """Print text in small chunks to simulate streaming (delay is per character)."""
+    write = sys.stdout.write
+    for i in range(0, len(text), chunk):
+        piece = text[i:i + chunk]
+        write(piece)
         sys.stdout.flush()
-        time.sleep(delay)
-    sys.stdout.write("\n")
+        time.sleep(delay * len(piece))
+    write("\n")
     sys.stdout.flush()
 
 
 def collect_question_ids(survey: Survey) -> Set[str]:
-    ids: Set[str] = set()
-    ids.update(q.question_id for q in survey.SCREENER.questions)
-    for sub in survey.MAIN_SECTION.sub_sections:
-        ids.update(q.question_id for q in sub.questions)
-    ids.update(q.question_id for q in survey.DEMOGRAPHICS.questions)
-    return ids
+    return {
+        q.question_id
+        for q in itertools.chain(
+            survey.SCREENER.questions,
+            *(sub.questions for sub in survey.MAIN_SECTION.sub_sections),
+            survey.DEMOGRAPHICS.questions,
+        )
+    }
 
 
 if __name__ == "__main__":
-    brief_data = json.loads(Path("brief_output.json").read_text(encoding="utf-8"))
+    brief_data = orjson.loads(Path("brief_output.json").read_bytes())
 
     # Initialize generator with default model
     # Skills will be loaded automatically based on brief_data["skills"]
@@ -725,45 +881,50 @@ if __name__ == "__main__":
     # from langchain_openai import ChatOpenAI
     # generator = SurveyGenerator(llm=ChatOpenAI(model="gpt-4o"))
 
-    # Generate without streaming (more reliable for large JSON)
-    result = generator.generate(brief_data, stream_output=False)
-
-    if not result:
-        print("survey_output.json not written: no survey data was produced.")
-        sys.exit(2)
-
+    # Generate without streaming (more reliable for large JSON); parse + validate in one pass
     try:
-        survey = Survey.model_validate(result)
+        survey = generator.generate_model(brief_data)
     except ValidationError as exc:
         print("Validation error while parsing survey JSON:")
         print(exc)
         print("survey_output.json not written due to validation failure.")
         sys.exit(2)
+    except Exception as exc:
+        print(f"✗ Generation error: {exc}", flush=True)
+        print("survey_output.json not written: no survey data was produced.")
+        sys.exit(2)
 
     question_ids = collect_question_ids(survey)
-    referenced_ids: Set[str] = set()
-    for entry in survey.DIMENSION_COVERAGE_SUMMARY:
-        referenced_ids.update(entry.question_ids)
-
-    missing_ids = sorted(qid for qid in referenced_ids if qid not in question_ids)
+    missing_ids = sorted({
+        qid
+        for entry in survey.DIMENSION_COVERAGE_SUMMARY
+        for qid in entry.question_ids
+        if qid not in question_ids
+    })
 
     if missing_ids:
+        referenced_count = len({qid for entry in survey.DIMENSION_COVERAGE_SUMMARY for qid in entry.question_ids})
         print("Validation error: DIMENSION_COVERAGE_SUMMARY contains missing question_ids.")
         print(f"Total emitted question_ids: {len(question_ids)}")
-        print(f"Total referenced question_ids: {len(referenced_ids)}")
+        print(f"Total referenced question_ids: {referenced_count}")
         print("Missing question_ids:")
-        for qid in missing_ids:
-            print(f"- {qid}")
+        print("\n".join(f"- {qid}" for qid in missing_ids))
         print("survey_output.json not written due to missing question_ids.")
         sys.exit(2)
 
-    Path("survey_output.json").write_text(
-        json.dumps(survey.model_dump(), indent=2),
-        encoding="utf-8"
+    # One dump feeds both the JSON file and the markdown (format_markdown only reads it)
+    survey_data = survey.model_dump()
+    Path("survey_output.json").write_bytes(
+        orjson.dumps(survey_data, option=orjson.OPT_INDENT_2)
     )
     print("Saved survey_output.json")
 
     print("\n=== Markdown Output ===")
-    markdown_text = format_markdown(survey.model_dump())
+    markdown_text = format_markdown(survey_data)
     markdown_delay = float(os.getenv("MARKDOWN_STREAM_DELAY", "0.01"))
-    stream_text(markdown_text, delay=markdown_delay)
\ No newline at end of file
+    if markdown_delay > 0 and sys.stdout.isatty():
+        stream_text(markdown_text, delay=markdown_delay)
+    else:
+        # Nobody is watching (pipe/CI) or streaming is disabled: write it in one go
+        sys.stdout.write(markdown_text + "\n")
+        sys.stdout.flush()
\ No newline at end of file
@@ -2,7 +2,56 @@
 LOI (Length of Interview) calculation and configuration management.
 """
 
-from typing import Dict, Any, List, Tuple
+import sys
+from itertools import chain, compress
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+
+# Priority levels. Interned so values loaded from JSON can be mapped onto the
+# same objects and compared/looked up by identity first.
+PRIORITY_REQUIRED = sys.intern("required")
+PRIORITY_RECOMMENDED = sys.intern("recommended")
+PRIORITY_OPTIONAL = sys.intern("optional")
+
+# loi_visibility values
+VISIBILITY_VISIBLE = sys.intern("visible")
+VISIBILITY_HIDDEN = sys.intern("hidden")
+
+
+def _intern_priority(priority: Any) -> Any:
+    """Map a priority string onto the shared interned object (non-strings pass through)."""
+    return sys.intern(priority) if type(priority) is str else priority
+
+
+def _matrix_seconds(question: Dict[str, Any]) -> int:
+    # ~2-3 seconds per cell for simple matrices
+    return min(len(question.get("rows", [])) * 3, 45)
+
+
+def _single_choice_seconds(question: Dict[str, Any]) -> int:
+    option_count = len(question.get("options", []))
+    if option_count <= 5:
+        return 6
+    elif option_count <= 10:
+        return 10
+    else:
+        return 12
+
+
+def _ranking_seconds(question: Dict[str, Any]) -> int:
+    return min(len(question.get("options", [])) * 5, 30)
+
+
+# question_type -> completion time estimator (seconds); unknown types default to 10
+_QUESTION_TIME_ESTIMATORS: Dict[str, Callable[[Dict[str, Any]], int]] = {
+    "matrix": _matrix_seconds,
+    "single_choice": _single_choice_seconds,
+    "multiple_choice": lambda question: 12,
+    "ranking": _ranking_seconds,
+    "open_ended": lambda question: 30,
+    "numeric_input": lambda question: 8,
+    "scale": lambda question: 8,
+}
 
 
 class LOICalculator:
@@ -21,6 +70,72 @@ class LOICalculator:
     def __init__(self, survey: Dict[str, Any]):
         """Initialize with survey data."""
         self.survey = survey
+        self._questions: List[Dict[str, Any]] = []
+        self._qid_index: Dict[str, Dict[str, Any]] = {}
+        # Per-question LOI columns, parallel to self._questions
+        self._priorities: List[str] = []
+        self._ranks: List[int] = []
+        self._seconds: List[int] = []
+        self._max_ranks: Dict[str, int] = {}
+        # slider_position -> rank thresholds, valid until the columns are rebuilt
+        self._threshold_cache: Dict[int, Dict[str, Any]] = {}
+        # (slider_position, user_override states) and the loi_config last computed for them
+        self._loi_memo: Optional[Tuple[Tuple[Any, ...], Dict[str, Any]]] = None
+        self._columns_dirty = True
+        self._build_index()
+    
+    def _build_index(self):
+        """Build the flat question list and the question_id -> question index."""
+        screener = self.survey.get("SCREENER", {})
+        main_section = self.survey.get("MAIN_SECTION", {})
+        demographics = self.survey.get("DEMOGRAPHICS", {})
+        
+        # Screener, then main section sub_sections, then demographics
+        questions = list(chain(
+            screener.get("questions", []),
+            chain.from_iterable(
+                subsection.get("questions", []) for subsection in main_section.get("sub_sections", [])
+            ),
+            demographics.get("questions", []),
+        ))
+        
+        # First occurrence wins, matching the old linear scan for duplicate IDs
+        index = {}
+        for question in questions:
+            index.setdefault(question.get("question_id"), question)
+        
+        self._questions = questions
+        self._qid_index = index
+        self._columns_dirty = True
+    
+    def _build_columns(self):
+        """
+        Snapshot priority, priority_rank and estimated_seconds into parallel lists.
+        
+        These fields only change when LOI defaults are filled in or the index is
+        rebuilt, so recalculations read them from flat lists instead of probing
+        every question dict. user_override is still read from the question,
+        since pin/exclude change it between passes. The max ranks and the
+        per-position threshold table derive from the same fields and are
+        reset here too.
+        """
+        questions = self._questions
+        self._priorities = [_intern_priority(q.get("priority", PRIORITY_RECOMMENDED)) for q in questions]
+        self._ranks = [q.get("priority_rank", 1) for q in questions]
+        self._seconds = [q.get("estimated_seconds", 10) for q in questions]
+        self._max_ranks = self._get_max_priority_ranks(questions)
+        self._threshold_cache = {}
+        self._loi_memo = None
+        self._columns_dirty = False
+    
+    def rebuild_index(self):
+        """
+        Rebuild the question index.
+        
+        Call this after adding, removing or replacing questions in the survey
+        schema held by this calculator.
+        """
+        self._build_index()
         
     def add_loi_config(self, initial_position: int = 50) -> Dict[str, Any]:
         """
@@ -45,38 +160,23 @@ class LOICalculator:
     
     def _ensure_question_loi_fields(self):
         """Ensure all questions have required LOI fields with defaults."""
-        sections = [
-            self.survey.get("SCREENER", {}).get("questions", []),
-            self.survey.get("DEMOGRAPHICS", {}).get("questions", [])
-        ]
+        for question in self._get_all_questions():
+            # Add default priority if missing (inferred, so only computed when absent)
+            if "priority" not in question:
+                question["priority"] = self._infer_priority(question)
+            
+            # Add default priority_rank if missing
+            question.setdefault("priority_rank", 1)
+            
+            # Add default estimated_seconds if missing (estimated, so only computed when absent)
+            if "estimated_seconds" not in question:
+                question["estimated_seconds"] = self._estimate_question_time(question)
+            
+            # Add visibility state (defaults to visible) and user override state
+            question.setdefault("loi_visibility", VISIBILITY_VISIBLE)
+            question.setdefault("user_override", "none")
         
-        # Handle MAIN_SECTION with sub_sections
-        main_section = self.survey.get("MAIN_SECTION", {})
-        if "sub_sections" in main_section:
-            for subsection in main_section["sub_sections"]:
-                sections.append(subsection.get("questions", []))
-        
-        for question_list in sections:
-            for question in question_list:
-                # Add default priority if missing
-                if "priority" not in question:
-                    question["priority"] = self._infer_priority(question)
-                
-                # Add default priority_rank if missing
-                if "priority_rank" not in question:
-                    question["priority_rank"] = 1
-                
-                # Add default estimated_seconds if missing
-                if "estimated_seconds" not in question:
-                    question["estimated_seconds"] = self._estimate_question_time(question)
-                
-                # Add visibility state (defaults to visible)
-                if "loi_visibility" not in question:
-                    question["loi_visibility"] = "visible"
-                
-                # Add user override state
-                if "user_override" not in question:
-                    question["user_override"] = "none"
+        self._columns_dirty = True
     
     def _infer_priority(self, question: Dict[str, Any]) -> str:
         """
@@ -93,22 +193,22 @@ class LOICalculator:
         
         # Screener questions are required
         if question_id.startswith("SCR_"):
-            return "required"
+            return PRIORITY_REQUIRED
         
         # Demographics are recommended
         if question_id.startswith("DEM_"):
-            return "recommended"
+            return PRIORITY_RECOMMENDED
         
         # Large matrices are optional
         if question.get("rows") and len(question.get("rows", [])) > 5:
-            return "optional"
+            return PRIORITY_OPTIONAL
         
         # Questions with display logic are often optional
         if question.get("display_logic"):
-            return "optional"
+            return PRIORITY_OPTIONAL
         
         # Default to recommended
-        return "recommended"
+        return PRIORITY_RECOMMENDED
     
     def _estimate_question_time(self, question: Dict[str, Any]) -> int:
         """
@@ -116,48 +216,11 @@ class LOICalculator:
         
         Based on question type and complexity.
         """
-        q_type = question.get("question_type", "")
-        
-        # Matrix questions
-        if q_type == "matrix":
-            row_count = len(question.get("rows", []))
-            col_count = len(question.get("columns", []))
-            # ~2-3 seconds per cell for simple matrices
-            return min(row_count * 3, 45)
-        
-        # Single choice
-        if q_type == "single_choice":
-            option_count = len(question.get("options", []))
-            if option_count <= 5:
-                return 6
-            elif option_count <= 10:
-                return 10
-            else:
-                return 12
-        
-        # Multiple choice
-        if q_type == "multiple_choice":
-            return 12
-        
-        # Ranking
-        if q_type == "ranking":
-            item_count = len(question.get("options", []))
-            return min(item_count * 5, 30)
-        
-        # Open-ended
-        if q_type == "open_ended":
-            return 30
-        
-        # Numeric input
-        if q_type == "numeric_input":
-            return 8
-        
-        # Scale
-        if q_type == "scale":
-            return 8
-        
-        # Default
-        return 10
+        estimator = _QUESTION_TIME_ESTIMATORS.get(question.get("question_type", ""))
+        if estimator is None:
+            # Default
+            return 10
+        return estimator(question)
     
     def _calculate_loi_config(self, slider_position: int) -> Dict[str, Any]:
         """Calculate LOI configuration based on slider position."""
@@ -166,42 +229,61 @@ class LOICalculator:
         
         # Get all questions
         all_questions = self._get_all_questions()
+
+        if self._columns_dirty:
+            self._build_columns()
+        
+        # Nothing that affects visibility changed since the last pass (e.g. pinning an
+        # already pinned question): the question dicts are already up to date
+        overrides = [question.get("user_override", "none") for question in all_questions]
+        memo_key = (type(slider_position), slider_position, tuple(overrides))
+        if self._loi_memo is not None and self._loi_memo[0] == memo_key:
+            return dict(self._loi_memo[1])
+        
+        # Rank cutoffs only depend on the slider position, so look them up per position
+        thresholds = self._threshold_cache.get(slider_position)
+        if thresholds is None:
+            thresholds = self._rank_thresholds(slider_position, self._max_ranks)
+            self._threshold_cache[slider_position] = thresholds
         
         # Update visibility based on slider position
-        visible_count = 0
-        hidden_count = 0
         pinned_count = 0
         excluded_count = 0
-        total_seconds = 0
+        visible_flags = []
         
-        for question in all_questions:
+        for question, priority, priority_rank, override in zip(
+            all_questions, self._priorities, self._ranks, overrides
+        ):
             # Check user overrides first
-            override = question.get("user_override", "none")
             if override == "pinned":
-                question["loi_visibility"] = "visible"
+                is_visible = True
                 pinned_count += 1
-                visible_count += 1
-                total_seconds += question.get("estimated_seconds", 10)
             elif override == "excluded":
-                question["loi_visibility"] = "hidden"
+                is_visible = False
                 excluded_count += 1
-                hidden_count += 1
             else:
                 # Determine visibility based on slider position and priority
-                priority = question.get("priority", "recommended")
-                is_visible = self._should_show_question(slider_position, priority, question.get("priority_rank", 1))
-                
-                question["loi_visibility"] = "visible" if is_visible else "hidden"
-                if is_visible:
-                    visible_count += 1
-                    total_seconds += question.get("estimated_seconds", 10)
+                threshold = thresholds.get(priority, True)
+                if threshold is True or threshold is False:
+                    is_visible = threshold
                 else:
-                    hidden_count += 1
+                    is_visible = priority_rank <= threshold
+            
+            # Most questions keep their state between passes; only store actual flips
+            visibility = VISIBILITY_VISIBLE if is_visible else VISIBILITY_HIDDEN
+            if question.get("loi_visibility") != visibility:
+                question["loi_visibility"] = visibility
+            visible_flags.append(is_visible)
+        
+        # Counts and time fall out of the visibility flags in single C-level passes
+        visible_count = sum(visible_flags)
+        hidden_count = len(visible_flags) - visible_count
+        total_seconds = sum(compress(self._seconds, visible_flags))
         
         # Calculate LOI in minutes
         estimated_loi = round(total_seconds / 60, 1)
         
-        return {
+        loi_config = {
             "slider_position": slider_position,
             "snap_point": snap_point,
             "estimated_loi_minutes": estimated_loi,
@@ -211,6 +293,8 @@ class LOICalculator:
             "user_pinned_count": pinned_count,
             "user_excluded_count": excluded_count
         }
+        self._loi_memo = (memo_key, loi_config)
+        return dict(loi_config)
     
     def _get_snap_point(self, position: int) -> str:
         """Determine which snap point the position represents."""
@@ -221,9 +305,9 @@ class LOICalculator:
         else:
             return "deep"
     
-    def _should_show_question(self, slider_position: int, priority: str, priority_rank: int) -> bool:
+    def _rank_thresholds(self, slider_position: int, max_ranks: Dict[str, int]) -> Dict[str, Any]:
         """
-        Determine if a question should be visible at a given slider position.
+        Resolve the visibility rule for each priority level at a slider position.
         
         Uses priority thresholds that expand based on slider position:
         - Quick (0-30): Only "required" questions shown
@@ -231,87 +315,58 @@ class LOICalculator:
         - Deep (70-100): All "required" and "recommended", + progressively add "optional" by priority_rank
         
         Within each tier, lower priority_rank questions are shown first.
+        
+        Returns a mapping of priority level to True (show all), False (hide all)
+        or an int rank threshold (show questions with priority_rank <= threshold).
+        Levels not in the mapping ("required" and unknown priorities) are always shown.
         """
-        if priority == "required":
-            # Always show required questions
-            return True
+        thresholds: Dict[str, Any] = {}
         
-        if priority == "recommended":
+        # Recommended
+        if slider_position <= 30:
             # Below Quick tier: hide all recommended
-            if slider_position <= 30:
-                return False
-            
+            thresholds[PRIORITY_RECOMMENDED] = False
+        elif slider_position >= 70:
             # At or above Deep tier: show all recommended
-            if slider_position >= 70:
-                return True
-            
+            thresholds[PRIORITY_RECOMMENDED] = True
+        else:
             # In Standard tier (30-70): progressive show based on priority_rank
             # Calculate what percentage through the Standard tier we are
             progress = (slider_position - 30) / 40  # 0.0 at position 30, 1.0 at position 70
             
-            # Get max priority_rank among recommended questions
-            max_recommended_rank = self._get_max_priority_rank("recommended")
-            
             # Calculate threshold: at position 30, show rank 1 only; at 70, show all
             # Use ceiling so we always show at least 1 question
-            rank_threshold = max(1, round(progress * max_recommended_rank))
-            
-            return priority_rank <= rank_threshold
+            thresholds[PRIORITY_RECOMMENDED] = max(1, round(progress * max_ranks[PRIORITY_RECOMMENDED]))
         
-        if priority == "optional":
+        # Optional
+        if slider_position < 70:
             # Below Deep tier: hide all optional
-            if slider_position < 70:
-                return False
-            
+            thresholds[PRIORITY_OPTIONAL] = False
+        elif slider_position >= 100:
             # At max position: show all optional
-            if slider_position >= 100:
-                return True
-            
+            thresholds[PRIORITY_OPTIONAL] = True
+        else:
             # In Deep tier (70-100): progressive show based on priority_rank
             progress = (slider_position - 70) / 30  # 0.0 at position 70, 1.0 at position 100
-            
-            # Get max priority_rank among optional questions
-            max_optional_rank = self._get_max_priority_rank("optional")
-            
-            # Calculate threshold
-            rank_threshold = max(1, round(progress * max_optional_rank))
-            
-            return priority_rank <= rank_threshold
+            thresholds[PRIORITY_OPTIONAL] = max(1, round(progress * max_ranks[PRIORITY_OPTIONAL]))
         
-        # Unknown priority - default to showing
-        return True
+        return thresholds
     
-    def _get_max_priority_rank(self, priority_level: str) -> int:
-        """Get the maximum priority_rank value for a given priority level."""
-        all_questions = self._get_all_questions()
-        max_rank = 1
+    def _get_max_priority_ranks(self, questions: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Get the maximum priority_rank for the recommended and optional levels in one pass."""
+        max_ranks = {PRIORITY_RECOMMENDED: 1, PRIORITY_OPTIONAL: 1}
         
-        for question in all_questions:
-            if question.get("priority") == priority_level:
+        for question in questions:
+            priority = question.get("priority")
+            if priority in max_ranks:
                 rank = question.get("priority_rank", 1)
-                max_rank = max(max_rank, rank)
+                max_ranks[priority] = max(max_ranks[priority], rank)
         
-        return max_rank
+        return max_ranks
     
     def _get_all_questions(self) -> List[Dict[str, Any]]:
         """Get flat list of all questions in survey."""
-        questions = []
-        
-        # Screener questions
-        screener = self.survey.get("SCREENER", {})
-        questions.extend(screener.get("questions", []))
-        
-        # Main section questions (with sub_sections)
-        main_section = self.survey.get("MAIN_SECTION", {})
-        if "sub_sections" in main_section:
-            for subsection in main_section["sub_sections"]:
-                questions.extend(subsection.get("questions", []))
-        
-        # Demographics questions
-        demographics = self.survey.get("DEMOGRAPHICS", {})
-        questions.extend(demographics.get("questions", []))
-        
-        return questions
+        return self._questions
     
     def update_loi_config(self, slider_position: int) -> Dict[str, Any]:
         """
@@ -328,7 +383,7 @@ class LOICalculator:
         question = self._find_question(question_id)
         if question:
             question["user_override"] = "pinned"
-            question["loi_visibility"] = "visible"
+            question["loi_visibility"] = VISIBILITY_VISIBLE
         
         # Recalculate LOI config
         current_position = self.survey.get("loi_config", {}).get("slider_position", 50)
@@ -339,7 +394,7 @@ class LOICalculator:
         question = self._find_question(question_id)
         if question:
             question["user_override"] = "excluded"
-            question["loi_visibility"] = "hidden"
+            question["loi_visibility"] = VISIBILITY_HIDDEN
         
         # Recalculate LOI config
         current_position = self.survey.get("loi_config", {}).get("slider_position", 50)
@@ -357,8 +412,4 @@ class LOICalculator:
     
     def _find_question(self, question_id: str) -> Dict[str, Any] | None:
         """Find a question by ID."""
-        all_questions = self._get_all_questions()
-        for question in all_questions:
-            if question.get("question_id") == question_id:
-                return question
-        return None
+        return self._qid_index.get(question_id)
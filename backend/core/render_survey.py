@@ -4,15 +4,18 @@ import copy
 import json
 import hashlib
 import re
+import orjson
 from dataclasses import dataclass, asdict
-from typing import Any, Dict, List, Optional, Tuple, Union
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 
 # ----------------------------
 # Error model (for targeted repair)
 # ----------------------------
 
-@dataclass
+@dataclass(slots=True)
 class ValidationIssue:
     issue_id: str
     issue_fingerprint: str
@@ -31,13 +34,17 @@ class JsonPatchError(Exception):
     pass
 
 
-def _split_pointer(path: str) -> List[str]:
+@lru_cache(maxsize=1024)
+def _split_pointer(path: str) -> Tuple[str, ...]:
+    # Cached: repair loops patch the same few paths over and over
     if path == "":
-        return []
+        return ()
     if not path.startswith("/"):
         raise JsonPatchError(f"Invalid JSON pointer: {path}")
     parts = path.lstrip("/").split("/")
-    return [p.replace("~1", "/").replace("~0", "~") for p in parts]
+    if "~" not in path:
+        return tuple(parts)
+    return tuple(p.replace("~1", "/").replace("~0", "~") if "~" in p else p for p in parts)
 
 
 def _get_parent_and_key(doc: Any, pointer: str) -> Tuple[Any, Union[str, int]]:
@@ -47,9 +54,12 @@ def _get_parent_and_key(doc: Any, pointer: str) -> Tuple[Any, Union[str, int]]:
 
     parent = doc
     for p in parts[:-1]:
-        if isinstance(parent, list):
-            idx = int(p)
-            parent = parent[idx]
+        # Exact type checks cover plain JSON containers; isinstance keeps subclasses working
+        container_type = type(parent)
+        if container_type is dict:
+            parent = parent[p]
+        elif container_type is list or isinstance(parent, list):
+            parent = parent[int(p)]
         elif isinstance(parent, dict):
             parent = parent[p]
         else:
@@ -62,7 +72,6 @@ def _get_parent_and_key(doc: Any, pointer: str) -> Tuple[Any, Union[str, int]]:
 
 
 def apply_json_patch(doc: Any, patch_ops: List[Dict[str, Any]]) -> Any:
-    doc = doc
     for op in patch_ops:
         operation = op.get("op")
         path = op.get("path")
@@ -73,15 +82,15 @@ def apply_json_patch(doc: Any, patch_ops: List[Dict[str, Any]]) -> Any:
         if path is None:
             raise JsonPatchError("Patch op missing 'path'")
 
+        parent, key = _get_parent_and_key(doc, path)
+
         if operation == "remove":
-            parent, key = _get_parent_and_key(doc, path)
             if isinstance(parent, list):
                 parent.pop(key)
             else:
                 parent.pop(key, None)
             continue
 
-        parent, key = _get_parent_and_key(doc, path)
         if isinstance(parent, list):
             if operation == "add":
                 if key == len(parent):
@@ -109,13 +118,37 @@ REQUIRED_TOP_LEVEL_KEYS = [
     "DIMENSION_COVERAGE_SUMMARY",
 ]
 
-ALLOWED_Q_TYPES = {"single_choice", "multiple_choice", "scale", "matrix", "open_ended", "stimulus_display", "numeric_input", "ranking"}
+ALLOWED_Q_TYPES = frozenset({"single_choice", "multiple_choice", "scale", "matrix", "open_ended", "stimulus_display", "numeric_input", "ranking"})
+# Question types whose answers are picked from 'options'
+OPTION_Q_TYPES = frozenset({"single_choice", "multiple_choice", "scale", "ranking"})
 
 
 def _fingerprint(error_code: str, json_path: str, question_id: Optional[str]) -> str:
-    payload = f"{error_code}|{json_path}|{question_id or ''}"
-    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
-    return f"sha256:{digest}"
+    # question_id is stringified here so the cache key is always hashable
+    return _fingerprint_cached(error_code, json_path, f"{question_id or ''}")
+
+
+@lru_cache(maxsize=4096)
+def _fingerprint_cached(error_code: str, json_path: str, question_id: str) -> str:
+    # Re-validating a patched survey re-raises mostly the same issues
+    payload = f"{error_code}|{json_path}|{question_id}"
+    # Dedup key only: 128-bit blake2b is plenty and cheaper than sha256 on short inputs
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+    return f"b2:{digest}"
+
+
+def _snapshot_json(value: Any) -> Any:
+    """Detached copy of a JSON-shaped container (orjson round-trip, deepcopy fallback)."""
+    if not isinstance(value, (dict, list)):
+        return value
+    try:
+        return orjson.loads(orjson.dumps(value))
+    except orjson.JSONEncodeError:
+        return copy.deepcopy(value)
+
+
+# add_issue sentinel: "no question_id to merge into fragment_ref" (None is a real value)
+_NO_QUESTION_ID = object()
 
 
 def _issue_id(counter: int) -> str:
@@ -124,8 +157,9 @@ def _issue_id(counter: int) -> str:
 
 def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List[ValidationIssue]]:
     issues: List[ValidationIssue] = []
-    s = copy.deepcopy(survey)
-    issue_counter = 0
+    # Copy-on-write: only the containers on the path to a normalised question are
+    # copied; everything else stays shared with the caller's (unmodified) survey.
+    s = dict(survey)
 
     def add_issue(
         *,
@@ -134,13 +168,16 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
         message: str,
         fragment_ref: Dict[str, Any],
         fragment: Any,
+        question_id: Any = _NO_QUESTION_ID,
     ):
-        nonlocal issue_counter
-        issue_counter += 1
+        if question_id is not _NO_QUESTION_ID:
+            # Question-level ref, only materialised when a question actually has an issue
+            fragment_ref = {**fragment_ref, "question_id": question_id}
         qid = fragment_ref.get("question_id")
         issues.append(
             ValidationIssue(
-                issue_id=_issue_id(issue_counter),
+                # Every call appends exactly one issue, so the list length is the counter
+                issue_id=_issue_id(len(issues) + 1),
                 issue_fingerprint=_fingerprint(error_code, json_path, qid),
                 error_code=error_code,
                 json_path=json_path,
@@ -164,7 +201,22 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
     if issues:
         return s, issues
 
-    def norm_question(q: Dict[str, Any], path: str, fragment_ref: Dict[str, Any]) -> Dict[str, Any]:
+    def repoint_fragments(since: int, old: Any, new: Any):
+        # Issues raised before a copy was made still point at the caller's object
+        for issue in issues[since:]:
+            if issue.fragment is old:
+                issue.fragment = new
+
+    def norm_question(q: Dict[str, Any], path: str, fragment_ref: Dict[str, Any], question_id: Any) -> Dict[str, Any]:
+        src = q
+        first_issue = len(issues)
+
+        def put(key: str, value: Any):
+            nonlocal q
+            if q is src:
+                q = dict(src)
+            q[key] = value
+
         hard_required = ["question_id", "question_text", "question_type"]
         for f in hard_required:
             if f not in q or q.get(f) in (None, ""):
@@ -173,23 +225,24 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
                     json_path=f"{path}/{f}",
                     message=f"Question missing required field '{f}'.",
                     fragment_ref=fragment_ref,
+                    question_id=question_id,
                     fragment=q,
                 )
 
         if "options" not in q or not isinstance(q.get("options"), list):
-            q["options"] = []
+            put("options", [])
         if "rows" not in q:
-            q["rows"] = None
+            put("rows", None)
         if "columns" not in q:
-            q["columns"] = None
+            put("columns", None)
         if "display_logic" not in q:
-            q["display_logic"] = None
+            put("display_logic", None)
         if "piping" not in q:
-            q["piping"] = None
+            put("piping", None)
         if "required" not in q:
-            q["required"] = True
+            put("required", True)
         if "notes" not in q:
-            q["notes"] = None
+            put("notes", None)
 
         qtype = q.get("question_type")
         if qtype not in ALLOWED_Q_TYPES:
@@ -198,6 +251,7 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
                 json_path=f"{path}/question_type",
                 message=f"Invalid question_type '{qtype}'. Allowed: {sorted(ALLOWED_Q_TYPES)}",
                 fragment_ref=fragment_ref,
+                question_id=question_id,
                 fragment=q,
             )
 
@@ -208,9 +262,10 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
                 json_path=f"{path}/options",
                 message="Field 'options' must be an array.",
                 fragment_ref=fragment_ref,
+                question_id=question_id,
                 fragment=q,
             )
-            q["options"] = []
+            put("options", [])
 
         if qtype in {"open_ended", "matrix", "numeric_input"}:
             if q.get("options") != []:
@@ -219,17 +274,19 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
                     json_path=f"{path}/options",
                     message=f"For question_type '{qtype}', options must be [].",
                     fragment_ref=fragment_ref,
+                    question_id=question_id,
                     fragment=q,
                 )
-                q["options"] = []
+                put("options", [])
 
-        if qtype in {"single_choice", "multiple_choice", "scale", "ranking"}:
+        if qtype in OPTION_Q_TYPES:
             if len(q.get("options", [])) == 0:
                 add_issue(
                     error_code="E_OPTIONS_REQUIRED",
                     json_path=f"{path}/options",
                     message=f"For question_type '{qtype}', options must be non-empty.",
                     fragment_ref=fragment_ref,
+                    question_id=question_id,
                     fragment=q,
                 )
 
@@ -240,15 +297,20 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
                     json_path=path,
                     message="Matrix questions require non-empty 'rows' and 'columns'.",
                     fragment_ref=fragment_ref,
+                    question_id=question_id,
                     fragment=q,
                 )
-                q["rows"] = q.get("rows") or []
-                q["columns"] = q.get("columns") or []
+                if not q.get("rows"):
+                    put("rows", [])
+                if not q.get("columns"):
+                    put("columns", [])
         else:
             if q.get("rows") is not None or q.get("columns") is not None:
-                q["rows"] = None
-                q["columns"] = None
+                put("rows", None)
+                put("columns", None)
 
+        if q is not src:
+            repoint_fragments(first_issue, src, q)
         return q
 
     seen_qids = set()
@@ -257,7 +319,8 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
         questions: List[Dict[str, Any]],
         base_path: str,
         fragment_ref_base: Dict[str, Any],
-    ):
+    ) -> List[Dict[str, Any]]:
+        """Validate a questions list; returns it, or a copy if any question was normalised."""
         nonlocal seen_qids
         if not isinstance(questions, list):
             add_issue(
@@ -267,8 +330,9 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
                 fragment_ref=fragment_ref_base,
                 fragment=questions,
             )
-            return
+            return questions
 
+        normalised = questions
         for i, q in enumerate(questions):
             q_path = f"{base_path}/{i}"
             if not isinstance(q, dict):
@@ -281,30 +345,41 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
                 )
                 continue
 
-            fragment_ref = dict(fragment_ref_base)
-            fragment_ref["question_id"] = q.get("question_id")
-            q = norm_question(q, q_path, fragment_ref)
             qid = q.get("question_id")
-            if qid in seen_qids:
+            q = norm_question(q, q_path, fragment_ref_base, qid)
+            if q is not questions[i]:
+                if normalised is questions:
+                    normalised = list(questions)
+                normalised[i] = q
+            # One hash probe per question: the set only stays the same size on a repeat
+            seen_before = len(seen_qids)
+            seen_qids.add(qid)
+            if len(seen_qids) == seen_before:
                 add_issue(
                     error_code="E_DUPLICATE_QUESTION_ID",
                     json_path=f"{q_path}/question_id",
                     message=f"Duplicate question_id '{qid}'.",
-                    fragment_ref=fragment_ref,
+                    fragment_ref=fragment_ref_base,
+                    question_id=qid,
                     fragment=q,
                 )
-            else:
-                seen_qids.add(qid)
+
+        return normalised
 
     # Screener
-    validate_questions_block(
-        s["SCREENER"].get("questions"),
+    screener = s["SCREENER"]
+    questions = screener.get("questions")
+    normalised = validate_questions_block(
+        questions,
         "/SCREENER/questions",
         {"section": "SCREENER"},
     )
+    if normalised is not questions:
+        s["SCREENER"] = {**screener, "questions": normalised}
 
     # Main sections
-    sub_sections = s["MAIN_SECTION"].get("sub_sections")
+    main_section = s["MAIN_SECTION"]
+    sub_sections = main_section.get("sub_sections")
     if not isinstance(sub_sections, list):
         add_issue(
             error_code="E_SUBSECTIONS_NOT_ARRAY",
@@ -315,6 +390,7 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
         )
     else:
         seen_ss_ids = set()
+        normalised_subs = sub_sections
         for si, ss in enumerate(sub_sections):
             ss_path = f"/MAIN_SECTION/sub_sections/{si}"
             if not isinstance(ss, dict):
@@ -327,6 +403,7 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
                 )
                 continue
 
+            first_issue = len(issues)
             ss_id = ss.get("subsection_id")
             fragment_ref = {"section": "MAIN_SECTION", "subsection_id": ss_id}
             if not ss_id:
@@ -348,18 +425,32 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
             else:
                 seen_ss_ids.add(ss_id)
 
-            validate_questions_block(
-                ss.get("questions"),
+            questions = ss.get("questions")
+            normalised = validate_questions_block(
+                questions,
                 f"{ss_path}/questions",
                 fragment_ref,
             )
+            if normalised is not questions:
+                new_ss = {**ss, "questions": normalised}
+                repoint_fragments(first_issue, ss, new_ss)
+                if normalised_subs is sub_sections:
+                    normalised_subs = list(sub_sections)
+                normalised_subs[si] = new_ss
+
+        if normalised_subs is not sub_sections:
+            s["MAIN_SECTION"] = {**main_section, "sub_sections": normalised_subs}
 
     # Demographics
-    validate_questions_block(
-        s["DEMOGRAPHICS"].get("questions"),
+    demographics = s["DEMOGRAPHICS"]
+    questions = demographics.get("questions")
+    normalised = validate_questions_block(
+        questions,
         "/DEMOGRAPHICS/questions",
         {"section": "DEMOGRAPHICS"},
     )
+    if normalised is not questions:
+        s["DEMOGRAPHICS"] = {**demographics, "questions": normalised}
 
     # Flow
     flow = s.get("FLOW", {})
@@ -383,6 +474,12 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
             fragment=summary,
         )
 
+    # Fragments still point into the normalised survey, which shares unchanged nodes
+    # with the caller's input. Snapshot them so patching either one later can't
+    # rewrite issues that were already reported.
+    for issue in issues:
+        issue.fragment = _snapshot_json(issue.fragment)
+
     return s, issues
 
 
@@ -390,15 +487,60 @@ def validate_and_normalise(survey: Dict[str, Any]) -> Tuple[Dict[str, Any], List
 # Rendering to UI spec
 # ----------------------------
 
+# Option labels like "7" or "7 - Very likely" (NPS detection)
+_LEADING_INT_RE = re.compile(r"^(\d+)(?:\s*-\s*.*)?$")
+# Artefact titles like "Concept A: ..."
+_CONCEPT_LETTER_RE = re.compile(r'Concept\s+([A-Z])', re.IGNORECASE)
+# Routing condition phrasings rewritten by _condition_to_plain_language
+_OPTION_EQ_RE = re.compile(r"([A-Z][A-Z0-9_]*)\s*=\s*'([^']+)'")
+_OPTION_NOT_INCLUDES_RE = re.compile(r"([A-Z][A-Z0-9_]*)\s+does not include\s+'([^']+)'")
+_OPTION_INCLUDES_RE = re.compile(r"([A-Z][A-Z0-9_]*)\s+includes?\s+'([^']+)'")
+_AND_RE = re.compile(r"\s+AND\s+", re.IGNORECASE)
+_OR_RE = re.compile(r"\s+OR\s+", re.IGNORECASE)
+# Conjoint "[OPTION X]" blocks and their "• Attribute: Value" lines
+_OPTION_BLOCK_RE = re.compile(r'\[OPTION\s+([A-Z])\]\s*\n(.*?)(?=\[OPTION\s+[A-Z]\]|$)', re.DOTALL | re.IGNORECASE)
+_ATTR_RE = re.compile(r'[•\-\*]\s*([^:]+):\s*([^\n]+)')
+# Artefact references in question text / piping
+_ARTEFACT_REF_RE = re.compile(r'\[DISPLAY\s+([A-Z]\d+)[:\s\]]|\{\{artefact:([A-Z]\d+)\}\}|artefact_id[\'"\']?\s*[:=]\s*[\'"\']?([A-Z]\d+)', re.IGNORECASE)
+_DISPLAY_CONCEPT_RE = re.compile(r'\[DISPLAY\s+CONCEPT\s+([A-Z])', re.IGNORECASE)
+# Routing rule actions
+_RANDOM_ASSIGN_RE = re.compile(r'randomly?\s+assign|random.*rotation|permutation', re.IGNORECASE)
+_ARTEFACT_ID_RE = re.compile(r'\b([A-Z]\d+)\b')
+_LETTER_SEQ_RE = re.compile(r'\b([A-Z]{2,})\b')
+_DISPLAY_ARTEFACT_RE = re.compile(r'Display\s+artefact\s+([A-Z]\d+).*with.*question\s+([A-Z0-9_]+)', re.IGNORECASE)
+_QID_TOKEN_RE = re.compile(r"\b[A-Z][A-Z0-9_]*\b")
+_ONLY_RE = re.compile(r"\bonly\b", re.IGNORECASE)
+_SHOW_RE = re.compile(r"^show\s+", re.IGNORECASE)
+_SKIP_RE = re.compile(r"^skip\s+", re.IGNORECASE)
+_TERMINATE_RE = re.compile(r"^terminate\b", re.IGNORECASE)
+
+
 def render_ui_spec(survey: Dict[str, Any]) -> Dict[str, Any]:
     md = survey["STUDY_METADATA"]
     artefacts = md.get("artefacts", [])
     question_ids = _collect_question_ids(survey)
-    routing_index, rule_metadata = _build_routing_index(survey.get("FLOW", {}), question_ids)
+    flow = survey.get("FLOW", {})
+    # Detected once and shared with the routing index; flows without rules skip the scan
+    artefact_assignments = _detect_artefact_assignment_rules(flow) if flow.get("routing_rules") else {}
+    routing_index, rule_metadata = _build_routing_index(flow, question_ids, artefact_assignments)
     
     # Create artefact lookup for conjoint display
     artefacts_by_id = {a.get("artefact_id"): a for a in artefacts}
 
+    # Conjoint tasks often repeat the same stimulus text, so parse each
+    # distinct text once per render. Keyed by the text itself rather than
+    # its hash so colliding texts can never share a result.
+    conjoint_cache: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    def parse_conjoint(text: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(text, str):
+            return _parse_conjoint_configuration(text)
+        try:
+            return conjoint_cache[text]
+        except KeyError:
+            parsed = conjoint_cache[text] = _parse_conjoint_configuration(text)
+            return parsed
+
     blocks: List[Dict[str, Any]] = []
 
     blocks.append(
@@ -441,7 +583,7 @@ def render_ui_spec(survey: Dict[str, Any]) -> Dict[str, Any]:
                         "artefact_type": a.get("artefact_type"),
                         "title": a.get("title"),
                         "content": a.get("content"),
-                        "parsed": _parse_conjoint_configuration(a.get("content")),
+                        "parsed": parse_conjoint(a.get("content")),
                     }
                     for a in artefacts
                 ],
@@ -461,7 +603,6 @@ def render_ui_spec(survey: Dict[str, Any]) -> Dict[str, Any]:
         )
 
     # Add artefact assignments summary if detected
-    artefact_assignments = _detect_artefact_assignment_rules(survey.get("FLOW", {}))
     if artefact_assignments:
         blocks.append(
             {
@@ -510,17 +651,20 @@ def render_ui_spec(survey: Dict[str, Any]) -> Dict[str, Any]:
         art_id = art.get("artefact_id", "")
         title = art.get("title", "")
         # Extract letter from titles like "Concept A:", "Concept B:"
-        letter_match = re.search(r'Concept\s+([A-Z])', title, re.IGNORECASE)
-        if letter_match and art_id:
-            artefact_map[letter_match.group(1).upper()] = art_id
+        if isinstance(title, str) and title.startswith("Concept ") and title[8:9].isascii() and title[8:9].isalpha():
+            # Common case: the letter directly follows the prefix, no regex needed
+            letter = title[8]
+        else:
+            letter_match = _CONCEPT_LETTER_RE.search(title)
+            letter = letter_match.group(1) if letter_match else None
+        if letter and art_id:
+            artefact_map[letter.upper()] = art_id
 
-    def q_display(q: Dict[str, Any], number: str, artefacts_by_id: Dict[str, Any] = None) -> Dict[str, Any]:
+    def q_display(q: Dict[str, Any], number: str) -> Dict[str, Any]:
         qid = q.get("question_id")
         qtype = q.get("question_type")
         options_for_ui = _normalise_options_for_ui(q)
-        
-        if artefacts_by_id is None:
-            artefacts_by_id = {}
+        has_options = qtype in OPTION_Q_TYPES
 
         annotations: List[Dict[str, str]] = []
         
@@ -547,13 +691,19 @@ def render_ui_spec(survey: Dict[str, Any]) -> Dict[str, Any]:
                     "text": f"Quota attribute: {quota_attr} — {group_summary}"
                 })
 
-        routing = routing_index.get(qid, {"shown_by_rules": [], "skipped_by_rules": [], "terminate_by_rules": []})
+        routing = routing_index.get(qid)
+        if routing is None:
+            # Emitted as part of the question, so each unrouted question gets its own dict
+            routing = {"shown_by_rules": [], "skipped_by_rules": [], "terminate_by_rules": []}
+        shown_by = routing["shown_by_rules"]
+        skipped_by = routing["skipped_by_rules"]
+        terminated_by = routing["terminate_by_rules"]
         
         # Generate user-centric routing annotations
-        if routing["terminate_by_rules"]:
+        if terminated_by:
             # Termination rules: explain when survey ends
             termination_texts = []
-            for rule_id in routing["terminate_by_rules"]:
+            for rule_id in terminated_by:
                 if rule_id in rule_metadata:
                     plain = rule_metadata[rule_id]["plain_condition"]
                     if plain:
@@ -561,10 +711,10 @@ def render_ui_spec(survey: Dict[str, Any]) -> Dict[str, Any]:
             if termination_texts:
                 annotations.append({"type": "routing", "text": " ".join(termination_texts)})
         
-        elif routing["shown_by_rules"]:
+        elif shown_by:
             # Show rules: explain when question is asked (answer-centric)
             show_conditions = []
-            for rule_id in routing["shown_by_rules"]:
+            for rule_id in shown_by:
                 if rule_id in rule_metadata:
                     plain = rule_metadata[rule_id]["plain_condition"]
                     if plain:
@@ -581,8 +731,8 @@ def render_ui_spec(survey: Dict[str, Any]) -> Dict[str, Any]:
         meta = {
             "type_label": _type_label(qtype),
             "answer_format": _answer_format(qtype),
-            "option_count": len(options_for_ui) if qtype in {"single_choice", "multiple_choice", "scale", "ranking"} else 0,
-            "is_routed": bool(routing["shown_by_rules"] or routing["skipped_by_rules"] or routing["terminate_by_rules"]),
+            "option_count": len(options_for_ui) if has_options else 0,
+            "is_routed": bool(shown_by or skipped_by or terminated_by),
             "required": q.get("required", True),  # V2: Add required field
         }
         
@@ -629,12 +779,12 @@ def render_ui_spec(survey: Dict[str, Any]) -> Dict[str, Any]:
                 "artefact_type": artefact.get("artefact_type"),
                 "title": artefact.get("title"),
                 "content": artefact.get("content"),
-                "parsed": _parse_conjoint_configuration(artefact.get("content"))
+                "parsed": parse_conjoint(artefact.get("content"))
             }
         else:
             # Inline conjoint in question text (current survey format)
             # Parse question text directly for configurations
-            parsed_configs = _parse_conjoint_configuration(q.get("question_text", ""))
+            parsed_configs = parse_conjoint(q.get("question_text", ""))
             if parsed_configs:
                 artefact_content = {
                     "artefact_id": None,  # Inline, no separate artefact
@@ -649,7 +799,7 @@ def render_ui_spec(survey: Dict[str, Any]) -> Dict[str, Any]:
             "question_id": qid,
             "question_text": q.get("question_text"),
             "question_type": qtype,
-            "options": options_for_ui if qtype in {"single_choice", "multiple_choice", "scale", "ranking"} else [],
+            "options": options_for_ui if has_options else [],
             "rows": q.get("rows"),
             "columns": q.get("columns"),
             "display_logic": q.get("display_logic"),
@@ -663,41 +813,10 @@ def render_ui_spec(survey: Dict[str, Any]) -> Dict[str, Any]:
             d["annotation_text"] = [a["text"] for a in annotations]
         return d
 
-    screener_qs = survey["SCREENER"]["questions"]
-    blocks.append(
-        {
-            "block_type": "section",
-            "section_id": "SCREENER",
-            "title": "Screener",
-            "questions": [q_display(q, f"S{i+1}", artefacts_by_id) for i, q in enumerate(screener_qs)],
-        }
-    )
-
-    sub_sections = survey["MAIN_SECTION"]["sub_sections"]
-    for ss_idx, ss in enumerate(sub_sections, start=1):
-        qs = ss.get("questions", [])
-        subsection_id = ss.get("subsection_id", f"MS{ss_idx}")
-        blocks.append(
-            {
-                "block_type": "subsection",
-                "section_id": "MAIN_SECTION",
-                "subsection_id": subsection_id,
-                "purpose": ss.get("purpose"),  # V2: Add purpose field
-                "title": ss.get("subsection_title", f"Main Subsection {ss_idx}"),
-                "questions": [q_display(q, f"{subsection_id}.{qi+1}", artefacts_by_id) for qi, q in enumerate(qs)],
-            }
-        )
+    for block, qs, number_prefix in _iter_question_sections(survey):
+        block["questions"] = [q_display(q, f"{number_prefix}{i}") for i, q in enumerate(qs, start=1)]
+        blocks.append(block)
 
-    demo_qs = survey["DEMOGRAPHICS"]["questions"]
-    blocks.append(
-        {
-            "block_type": "section",
-            "section_id": "DEMOGRAPHICS",
-            "title": "Demographics",
-            "questions": [q_display(q, f"D{i+1}", artefacts_by_id) for i, q in enumerate(demo_qs)],
-        }
-    )
-    
     # PROGRAMMING_SPECIFICATIONS section (V2 - optional)
     prog_spec = survey.get("PROGRAMMING_SPECIFICATIONS")
     if prog_spec:
@@ -754,30 +873,68 @@ def render_ui_spec(survey: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+_TYPE_LABELS = {
+    "single_choice": "Single choice",
+    "multiple_choice": "Multiple choice",
+    "scale": "Scale",
+    "matrix": "Matrix",
+    "open_ended": "Open ended",
+    "numeric_input": "Numeric input",  # V2: Add numeric_input
+    "stimulus_display": "Stimulus display",
+    "ranking": "Ranking",
+}
+
+_ANSWER_FORMATS = {
+    "single_choice": "Select one",
+    "multiple_choice": "Select one or more",
+    "scale": "Select one",
+    "matrix": "One response per row",
+    "numeric_input": "Enter number",  # V2: Add numeric_input
+    "open_ended": "Free text",
+    "stimulus_display": "Read only — no response collected",
+    "ranking": "Rank items in order",
+}
+
+
+def _iter_question_sections(survey: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], List[Any], str]]:
+    """Yield (block, questions, number_prefix) for each question section in display order.
+
+    The block is yielded without its "questions" entry; the caller fills it in.
+    """
+    yield (
+        {"block_type": "section", "section_id": "SCREENER", "title": "Screener"},
+        survey["SCREENER"]["questions"],
+        "S",
+    )
+
+    for ss_idx, ss in enumerate(survey["MAIN_SECTION"]["sub_sections"], start=1):
+        qs = ss.get("questions", [])
+        subsection_id = ss.get("subsection_id", f"MS{ss_idx}")
+        yield (
+            {
+                "block_type": "subsection",
+                "section_id": "MAIN_SECTION",
+                "subsection_id": subsection_id,
+                "purpose": ss.get("purpose"),  # V2: Add purpose field
+                "title": ss.get("subsection_title", f"Main Subsection {ss_idx}"),
+            },
+            qs,
+            f"{subsection_id}.",
+        )
+
+    yield (
+        {"block_type": "section", "section_id": "DEMOGRAPHICS", "title": "Demographics"},
+        survey["DEMOGRAPHICS"]["questions"],
+        "D",
+    )
+
+
 def _type_label(qtype: Optional[str]) -> str:
-    return {
-        "single_choice": "Single choice",
-        "multiple_choice": "Multiple choice",
-        "scale": "Scale",
-        "matrix": "Matrix",
-        "open_ended": "Open ended",
-        "numeric_input": "Numeric input",  # V2: Add numeric_input
-        "stimulus_display": "Stimulus display",
-        "ranking": "Ranking",
-    }.get(qtype or "", "")
+    return _TYPE_LABELS.get(qtype or "", "")
 
 
 def _answer_format(qtype: Optional[str]) -> str:
-    return {
-        "single_choice": "Select one",
-        "multiple_choice": "Select one or more",
-        "scale": "Select one",
-        "matrix": "One response per row",
-        "numeric_input": "Enter number",  # V2: Add numeric_input
-        "open_ended": "Free text",
-        "stimulus_display": "Read only — no response collected",
-        "ranking": "Rank items in order",
-    }.get(qtype or "", "")
+    return _ANSWER_FORMATS.get(qtype or "", "")
 
 
 def _normalise_options_for_ui(q: Dict[str, Any]) -> List[Dict[str, str]]:
@@ -786,29 +943,28 @@ def _normalise_options_for_ui(q: Dict[str, Any]) -> List[Dict[str, str]]:
         return []
 
     def parse_leading_int(label: str) -> Optional[int]:
-        match = re.match(r"^(\d+)(?:\s*-\s*.*)?$", label)
+        if label.isdecimal():
+            return int(label)
+        match = _LEADING_INT_RE.match(label)
         if match:
             return int(match.group(1))
         return None
 
-    labels = [str(opt).strip() for opt in options]
-    parsed = [parse_leading_int(label) for label in labels]
-    nps_candidates = {v for v in parsed if v is not None and 0 <= v <= 10}
-    is_nps = nps_candidates == set(range(0, 11))
-
-    if is_nps:
+    # NPS needs every value 0-10, so shorter lists skip the label parsing entirely
+    if len(options) >= 11:
+        parsed = [parse_leading_int(str(opt).strip()) for opt in options]
         used = {v for v in parsed if v is not None and 0 <= v <= 10}
-        result: List[Dict[str, str]] = []
-        for idx, opt in enumerate(options):
-            label = str(opt)
-            nps_value = parsed[idx]
-            if nps_value is not None and 0 <= nps_value <= 10:
-                code = str(nps_value)
-            else:
-                code = str(len(used))
-                used.add(len(used))
-            result.append({"code": code, "label": label})
-        return result
+        if len(used) == 11:
+            result: List[Dict[str, str]] = []
+            for opt, nps_value in zip(options, parsed):
+                label = str(opt)
+                if nps_value is not None and 0 <= nps_value <= 10:
+                    code = str(nps_value)
+                else:
+                    code = str(len(used))
+                    used.add(len(used))
+                result.append({"code": code, "label": label})
+            return result
 
     return [{"code": str(idx + 1), "label": str(opt)} for idx, opt in enumerate(options)]
 
@@ -822,17 +978,20 @@ def _condition_to_plain_language(condition: str) -> str:
     text = condition
     
     # Handle "= 'option text'" pattern
-    text = re.sub(r"([A-Z][A-Z0-9_]*)\s*=\s*'([^']+)'", r"you answered '\2'", text)
+    text = _OPTION_EQ_RE.sub(r"you answered '\2'", text)
     
     # Handle "does not include" pattern
-    text = re.sub(r"([A-Z][A-Z0-9_]*)\s+does not include\s+'([^']+)'", r"you did not select '\2'", text)
+    text = _OPTION_NOT_INCLUDES_RE.sub(r"you did not select '\2'", text)
     
     # Handle "includes" pattern
-    text = re.sub(r"([A-Z][A-Z0-9_]*)\s+includes?\s+'([^']+)'", r"you selected '\2'", text)
+    text = _OPTION_INCLUDES_RE.sub(r"you selected '\2'", text)
     
-    # Clean up AND/OR logic
-    text = re.sub(r"\s+AND\s+", " and ", text, flags=re.IGNORECASE)
-    text = re.sub(r"\s+OR\s+", " or ", text, flags=re.IGNORECASE)
+    # Clean up AND/OR logic (only scan when the word can occur at all)
+    lowered = text.lower()
+    if "and" in lowered:
+        text = _AND_RE.sub(" and ", text)
+    if "or" in lowered:
+        text = _OR_RE.sub(" or ", text)
     
     # Lowercase first character if not starting with specific words
     if text and not text.startswith(("You ", "If ")):
@@ -858,11 +1017,14 @@ def _parse_conjoint_configuration(question_text: str) -> Optional[Dict[str, Any]
     if not question_text:
         return None
     
+    # Every configuration starts with an "[OPTION X]" marker; most texts have no "[" at all
+    if "[" not in question_text:
+        return None
+    
     configs = []
     
     # Split by [OPTION X] markers
-    option_pattern = r'\[OPTION\s+([A-Z])\]\s*\n(.*?)(?=\[OPTION\s+[A-Z]\]|$)'
-    matches = re.findall(option_pattern, question_text, re.DOTALL | re.IGNORECASE)
+    matches = _OPTION_BLOCK_RE.findall(question_text)
     
     if not matches:
         return None
@@ -872,8 +1034,7 @@ def _parse_conjoint_configuration(question_text: str) -> Optional[Dict[str, Any]
         attributes = {}
         
         # Match lines starting with bullet (•, -, *) followed by "Attribute: Value"
-        attr_pattern = r'[•\-\*]\s*([^:]+):\s*([^\n]+)'
-        attr_matches = re.findall(attr_pattern, option_text)
+        attr_matches = _ATTR_RE.findall(option_text)
         
         for attr_name, attr_value in attr_matches:
             attributes[attr_name.strip()] = attr_value.strip()
@@ -912,12 +1073,8 @@ def _generate_configuration_summary(survey: Dict[str, Any]) -> List[Dict[str, An
             question_id = question.get("question_id", "")
             question_text = question.get("question_text", "")
             
-            # Check if this is a conjoint question
-            # (has [OPTION A], [OPTION B], [OPTION C] markers)
-            if not re.search(r'\[OPTION\s+[A-Z]\]', question_text, re.IGNORECASE):
-                continue
-            
-            # Parse configurations
+            # Conjoint questions have [OPTION A], [OPTION B], [OPTION C] markers;
+            # the parser returns None for anything else
             parsed = _parse_conjoint_configuration(question_text)
             
             if parsed and parsed.get('configurations'):
@@ -949,12 +1106,12 @@ def _extract_artefact_references(text: str, artefact_map: Dict[str, str] = None)
     artefact_ids = []
     
     # Match patterns like [DISPLAY A1], {{artefact:A1}}, artefact_id="A1"
-    matches = re.findall(r'\[DISPLAY\s+([A-Z]\d+)[:\s\]]|\{\{artefact:([A-Z]\d+)\}\}|artefact_id[\'"\']?\s*[:=]\s*[\'"\']?([A-Z]\d+)', text, re.IGNORECASE)
+    matches = _ARTEFACT_REF_RE.findall(text)
     for match_groups in matches:
         artefact_ids.extend([m for m in match_groups if m])
     
     # Match patterns like [DISPLAY CONCEPT A], [DISPLAY CONCEPT B]
-    concept_matches = re.findall(r'\[DISPLAY\s+CONCEPT\s+([A-Z])', text, re.IGNORECASE)
+    concept_matches = _DISPLAY_CONCEPT_RE.findall(text)
     for letter in concept_matches:
         letter_upper = letter.upper()
         if artefact_map and letter_upper in artefact_map:
@@ -963,7 +1120,7 @@ def _extract_artefact_references(text: str, artefact_map: Dict[str, str] = None)
             # Default mapping: A→A1, B→A2, C→A3, etc.
             artefact_ids.append(f"A{ord(letter_upper) - ord('A') + 1}")
     
-    return sorted(set(artefact_ids))
+    return sorted(set(artefact_ids)) if len(artefact_ids) > 1 else artefact_ids
 
 
 def _detect_artefact_assignment_rules(flow: Dict[str, Any]) -> Dict[str, Any]:
@@ -979,13 +1136,13 @@ def _detect_artefact_assignment_rules(flow: Dict[str, Any]) -> Dict[str, Any]:
         action = str(rule.get("action", ""))
         
         # Look for randomization patterns
-        if re.search(r'randomly?\s+assign|random.*rotation|permutation', action, re.IGNORECASE):
+        if _RANDOM_ASSIGN_RE.search(action):
             # Extract artefact IDs (A1, A2, etc.) mentioned in action
-            artefact_ids = re.findall(r'\b([A-Z]\d+)\b', action)
+            artefact_ids = _ARTEFACT_ID_RE.findall(action)
             
             # Also look for concept letter sequences like ABC, ACB, BAC
             if not artefact_ids:
-                letter_sequences = re.findall(r'\b([A-Z]{2,})\b', action)
+                letter_sequences = _LETTER_SEQ_RE.findall(action)
                 if letter_sequences:
                     # Extract unique letters and convert to artefact IDs (A→A1, B→A2, C→A3)
                     letters = set()
@@ -1004,9 +1161,36 @@ def _detect_artefact_assignment_rules(flow: Dict[str, Any]) -> Dict[str, Any]:
     return assignments
 
 
-def _build_routing_index(flow: Dict[str, Any], question_ids: List[str]) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+def _clause_verb(clause: str) -> Optional[str]:
+    """Return "show", "skip" or "terminate" for a stripped routing action clause, else None."""
+    head = clause[:10]
+    if not head.isascii():
+        # Leave non-ASCII case folding ("ſ", "ı", ...) and whitespace to the regexes
+        if _SHOW_RE.match(clause):
+            return "show"
+        if _SKIP_RE.match(clause):
+            return "skip"
+        if _TERMINATE_RE.match(clause):
+            return "terminate"
+        return None
+    lowered = head.lower()
+    if lowered.startswith(("show", "skip")) and head[4:5].isspace():
+        return lowered[:4]
+    if lowered.startswith("terminate") and not (head[9:10].isalnum() or head[9:10] == "_"):
+        return "terminate"
+    return None
+
+
+def _build_routing_index(
+    flow: Dict[str, Any],
+    question_ids: List[str],
+    artefact_assignments: Optional[Dict[str, Any]] = None,
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
     """Build routing index and rule metadata.
     
+    artefact_assignments may be passed in when the caller has already run
+    _detect_artefact_assignment_rules on the same flow.
+
     Returns:
         - routing_index: Maps question_id to {shown_by_rules, skipped_by_rules, terminate_by_rules}
         - rule_metadata: Maps rule_id to {condition, action, plain_condition, artefact_assignments}
@@ -1020,26 +1204,15 @@ def _build_routing_index(flow: Dict[str, Any], question_ids: List[str]) -> Tuple
     qid_set = set(question_ids)
     
     # Detect artefact assignments
-    artefact_assignments = _detect_artefact_assignment_rules(flow)
+    if artefact_assignments is None:
+        artefact_assignments = _detect_artefact_assignment_rules(flow)
 
-    # Build rule metadata first
-    for rule in rules:
-        if not isinstance(rule, dict):
-            continue
-        rule_id = str(rule.get("rule_id", "")).strip()
-        condition = str(rule.get("condition", ""))
-        action = str(rule.get("action", ""))
-        
-        rule_metadata[rule_id] = {
-            "condition": condition,
-            "action": action,
-            "plain_condition": _condition_to_plain_language(condition),
-        }
-        
-        # Add artefact assignment info if this rule handles it
-        for assignment_key, assignment_info in artefact_assignments.items():
-            if assignment_info['rule_id'] == rule_id:
-                rule_metadata[rule_id]['artefact_assignment'] = assignment_info
+    # Assignment info keyed by the rule that handles it; rule ids below are
+    # always strings, so non-string ids could never match anyway
+    assignment_by_rule_id: Dict[str, Dict[str, Any]] = {}
+    for assignment_info in artefact_assignments.values():
+        if isinstance(assignment_info['rule_id'], str):
+            assignment_by_rule_id[assignment_info['rule_id']] = assignment_info
 
     def ensure(qid: str) -> Dict[str, Any]:
         if qid not in routing_index:
@@ -1054,15 +1227,16 @@ def _build_routing_index(flow: Dict[str, Any], question_ids: List[str]) -> Tuple
     def find_qids(text: str) -> List[str]:
         if not text:
             return []
-        tokens = re.findall(r"\b[A-Z][A-Z0-9_]*\b", text)
+        tokens = _QID_TOKEN_RE.findall(text)
         return [token for token in tokens if token in qid_set]
 
     def apply_clause(rule_id: str, clause: str, bucket: str):
-        clause_clean = re.sub(r"\bonly\b", "", clause, flags=re.IGNORECASE)
+        clause_clean = _ONLY_RE.sub("", clause)
         qids = find_qids(clause_clean)
         for qid in qids:
             ensure(qid)[bucket].append(rule_id)
 
+    # Single pass: record each rule's metadata, then apply its clauses
     for rule in rules:
         if not isinstance(rule, dict):
             continue
@@ -1070,12 +1244,19 @@ def _build_routing_index(flow: Dict[str, Any], question_ids: List[str]) -> Tuple
         condition = str(rule.get("condition", ""))
         action = str(rule.get("action", ""))
 
+        metadata = rule_metadata[rule_id] = {
+            "condition": condition,
+            "action": action,
+            "plain_condition": _condition_to_plain_language(condition),
+        }
+
+        # Add artefact assignment info if this rule handles it
+        assignment_info = assignment_by_rule_id.get(rule_id)
+        if assignment_info is not None:
+            metadata['artefact_assignment'] = assignment_info
+
         # Detect "Display artefact X with question Y" pattern
-        display_match = re.search(
-            r'Display\s+artefact\s+([A-Z]\d+).*with.*question\s+([A-Z0-9_]+)',
-            action,
-            re.IGNORECASE
-        )
+        display_match = _DISPLAY_ARTEFACT_RE.search(action)
         if display_match:
             artefact_id = display_match.group(1)
             question_id = display_match.group(2)
@@ -1083,17 +1264,21 @@ def _build_routing_index(flow: Dict[str, Any], question_ids: List[str]) -> Tuple
 
         clauses = [c.strip() for c in action.split(";") if c.strip()]
         for clause in clauses:
-            if re.match(r"^show\s+", clause, flags=re.IGNORECASE):
+            verb = _clause_verb(clause)
+            if verb == "show":
                 apply_clause(rule_id, clause, "shown_by_rules")
-            elif re.match(r"^skip\s+", clause, flags=re.IGNORECASE):
+            elif verb == "skip":
                 apply_clause(rule_id, clause, "skipped_by_rules")
-            elif re.match(r"^terminate\b", clause, flags=re.IGNORECASE):
+            elif verb == "terminate":
                 for qid in find_qids(condition):
                     ensure(qid)["terminate_by_rules"].append(rule_id)
 
-    for qid, buckets in routing_index.items():
+    # Empty and single-rule buckets are already deduplicated and sorted
+    for buckets in routing_index.values():
         for key in ("shown_by_rules", "skipped_by_rules", "terminate_by_rules"):
-            buckets[key] = sorted(set(buckets.get(key, [])))
+            rule_ids = buckets[key]
+            if len(rule_ids) > 1:
+                buckets[key] = sorted(set(rule_ids))
 
     return routing_index, rule_metadata
 
@@ -1115,8 +1300,6 @@ def _collect_question_ids(survey: Dict[str, Any]) -> List[str]:
 
 def calculate_completeness(survey: Dict[str, Any]) -> Dict[str, Any]:
     """Calculate survey completeness score and missing components."""
-    import random
-    
     present = []
     missing = []
     
@@ -1143,30 +1326,38 @@ def calculate_completeness(survey: Dict[str, Any]) -> Dict[str, Any]:
     else:
         present.append("Estimated LOI")
     
-    # Check question notes (sample some questions)
-    questions = []
-    for section_name in ["SCREENER", "DEMOGRAPHICS"]:
-        section = survey.get(section_name, {})
-        questions.extend(section.get("questions", []))
-    
+    # One walk over the subsections collects their question lists and purposes
     main = survey.get("MAIN_SECTION", {})
-    for subsec in main.get("sub_sections", []):
-        questions.extend(subsec.get("questions", []))
+    subsections = main.get("sub_sections", [])
+    subsection_questions = []
+    has_purposes = False
+    for subsec in subsections:
+        subsection_questions.append(subsec.get("questions", []))
+        if not has_purposes and subsec.get("purpose"):
+            has_purposes = True
+
+    # Check question notes (any question with notes counts)
+    questions = chain(
+        survey.get("SCREENER", {}).get("questions", []),
+        survey.get("DEMOGRAPHICS", {}).get("questions", []),
+        chain.from_iterable(subsection_questions),
+    )
+    has_questions = False
+    has_notes = False
+    for q in questions:
+        has_questions = True
+        if q.get("notes"):
+            has_notes = True
+            break
     
-    if questions:
-        sample_size = min(5, len(questions))
-        sample_questions = random.sample(questions, sample_size)
-        notes_count = sum(1 for q in sample_questions if q.get("notes"))
-        has_notes = notes_count > 0
+    if has_questions:
         if has_notes:
             present.append("Question notes")
         else:
             missing.append("Question notes/rationale")
     
     # Check subsection purposes
-    subsections = main.get("sub_sections", [])
     if subsections:
-        has_purposes = any(s.get("purpose") for s in subsections)
         if has_purposes:
             present.append("Subsection purposes")
         else: